@@ -0,0 +1,52 @@
+"""Regression benchmark of Numba allocations against the sweep count, run with `python3 -m benchmarks.allocations`."""
+import os
+import sys
+import time
+
+# Must be set before Numba is imported for the runtime to count allocations
+os.environ.setdefault('NUMBA_NRT_STATS', '1')
+
+from numba.core.runtime import rtsys  # pylint: disable=wrong-import-position
+from benchmarks.backends import random_grid  # pylint: disable=wrong-import-position
+from solver.parallel import parallel_value_iteration  # pylint: disable=wrong-import-position
+
+
+GRID_DIMS = (2, 8, 32, 128, 512)
+
+
+def count_allocations(rewards):
+    """Solves a grid and returns the sweep count, allocations and time."""
+    before = rtsys.get_allocation_stats()
+    start_time = time.perf_counter()
+    _, count = parallel_value_iteration(rewards)
+    total_time = time.perf_counter() - start_time
+    after = rtsys.get_allocation_stats()
+    return count, after.alloc - before.alloc, total_time
+
+
+def main():
+    """Prints allocations per solve and checks that they stay flat.
+
+    The grids need different numbers of sweeps, but the kernel allocates
+    its buffers once, so every solve should make the same number of Numba
+    runtime allocations. Returns a non-zero exit status when they differ.
+    """
+    # Compile outside of the measured solves
+    parallel_value_iteration(random_grid(2, 0.0, 0))
+
+    allocations = set()
+    print(f"{'grid':>9} {'sweeps':>7} {'allocations':>12} {'time':>10}")
+    for dim in GRID_DIMS:
+        count, allocs, total_time = count_allocations(random_grid(dim, 0.0, 0))
+        allocations.add(allocs)
+        print(f"{dim:>4}x{dim:<4} {count:>7} {allocs:>12} {total_time:>9.4f}s")
+
+    if len(allocations) != 1:
+        print("FAIL: allocations grow with the sweep count")
+        return 1
+    print("OK: allocations are independent of the sweep count")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
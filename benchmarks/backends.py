@@ -0,0 +1,217 @@
+"""Throughput benchmark of the solver backends, run with `python3 -m benchmarks.backends`."""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+# The tiled workers are forked after parallel solves, which makes TBB hang the process at exit
+os.environ.setdefault('NUMBA_THREADING_LAYER_PRIORITY', 'omp workqueue tbb')
+
+# pylint: disable=wrong-import-position
+import numpy as np
+from solver.constants import SOLVE_MODES, CellType
+from solver.dispatch import use_threads
+from solver.grid import cell_rewards
+from solver.prebuilt import numba
+from solver.value_iteration import BACKENDS, KERNEL_WARM_UPS, MODE_BACKENDS, solve, solve_with_stats, warm_up
+
+
+DEFAULT_SIZES = (20, 100, 500, 2000)
+DEFAULT_DENSITIES = (0.0, 0.1, 0.3)
+
+# Share of the obstacles that are fires, the rest are rocks
+FIRE_SHARE = 0.2
+# Backends whose kernels run on Numba threads, they are timed at every thread count
+NUMBA_THREAD_BACKENDS = ('parallel', 'sparse') if numba else ()
+
+
+def random_grid(size, density, seed):
+    """Builds a seeded size x size CellType grid with the given obstacle density.
+
+    The mouse starts in the top left corner and the cheese is in the bottom
+    right corner, the other cells are obstacles with probability density.
+    """
+    rng = np.random.default_rng(seed)
+    cells = np.full((size, size), CellType.EMPTY, dtype=np.uint8)
+    obstacles = rng.random((size, size)) < density
+    fires = rng.random((size, size)) < FIRE_SHARE
+    cells[obstacles & fires] = CellType.FIRE
+    cells[obstacles & ~fires] = CellType.ROCK
+    cells[0, 0] = CellType.MOUSE
+    cells[size - 1, size - 1] = CellType.REWARD
+    return cells
+
+
+def thread_counts(requested):
+    """Returns the thread counts to sweep, all of them up to the core count by default."""
+    if requested:
+        return sorted(set(requested))
+    max_threads = numba.config.NUMBA_NUM_THREADS if numba else os.cpu_count() or 1
+    return sorted({1, max(max_threads//2, 1), max_threads})
+
+
+def backend_options(backend, threads, mode):
+    """Returns the solve options of a backend for a thread count and a mode."""
+    if backend == 'tiled':
+        return {'workers': threads}
+    return {'mode': mode}
+
+
+def time_solve(grid, backend, options, repeats):
+    """Solves a grid once untimed, then repeats times.
+
+    Returns the wall times of the timed solves and the SolveStats of the last
+    one.
+    """
+    solve(grid, backend, **options)
+    times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        _, stats = solve_with_stats(grid, backend, **options)
+        times.append(time.perf_counter() - start_time)
+    return times, stats
+
+
+def run_case(backend, size, density, threads, mode, args):
+    """Benchmarks one backend on one map and returns its result record."""
+    cells = random_grid(size, density, args.seed)
+    grid = cells if args.cell_types else cell_rewards(cells)
+    options = backend_options(backend, threads, mode)
+    with use_threads(threads if backend in NUMBA_THREAD_BACKENDS else None):
+        times, stats = time_solve(grid, backend, options, args.repeats)
+    count = stats.count
+    median_time = statistics.median(times)
+    return {
+        'backend': backend,
+        'size': size,
+        'density': density,
+        'threads': threads,
+        'mode': mode,
+        'sweeps': count,
+        'best_time': min(times),
+        'median_time': median_time,
+        'sweeps_per_second': count/median_time,
+        'cells_per_second': count*size*size/median_time,
+        'setup_time': stats.setup_time,
+        'sweep_time': stats.sweep_time,
+        'copy_time': stats.copy_time,
+    }
+
+
+def threading_layer():
+    """Returns the Numba threading layer parallel kernels ran on, or None if none ran yet."""
+    try:
+        return numba.threading_layer() if numba else None
+    except ValueError:
+        return None
+
+
+def machine_info():
+    """Describes the machine and library versions the benchmark ran with.
+
+    Called after the kernels are warmed up, so the threading layer they
+    picked is known.
+    """
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'numba': numba.__version__ if numba else None,
+        'threading_layer': threading_layer(),
+    }
+
+
+def parse_args(argv):
+    """Parses the command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.backends',
+        description="Benchmark the value iteration backends on seeded random maps.")
+    parser.add_argument('-b', '--backends', nargs='+', choices=sorted(BACKENDS), default=sorted(BACKENDS),
+                        help="backends to benchmark (default: all)")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help=f"map sides in cells (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--densities', nargs='+', type=float, default=DEFAULT_DENSITIES,
+                        help=f"obstacle densities (default: {' '.join(map(str, DEFAULT_DENSITIES))})")
+    parser.add_argument('--threads', nargs='+', type=int,
+                        help="thread counts of the parallel and tiled backends (default: 1, half and all cores)")
+    parser.add_argument('--modes', nargs='+', choices=SOLVE_MODES, default=SOLVE_MODES,
+                        help="solve modes of the backends that support them, Jacobi always runs (default: all)")
+    parser.add_argument('--repeats', type=int, default=3,
+                        help="timed solves per case (default: 3)")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="seed of the random maps (default: 0)")
+    parser.add_argument('--max-sequential-size', type=int, default=200,
+                        help="largest map side solved with the sequential backend (default: 200)")
+    parser.add_argument('--cell-types', action='store_true',
+                        help="solve uint8 cell type grids instead of rewards matrices")
+    parser.add_argument('-o', '--output',
+                        help="JSON file the results are written to (default: standard output)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Runs every benchmark case and writes the JSON report.
+
+    Seeded random maps of every size and obstacle density are solved with
+    every backend, in every solve mode the backend supports. The parallel
+    and sparse backends run at every Numba thread count, which is restored
+    after each case, and the tiled backend uses it as its number of worker
+    processes. Each result records the Jacobi sweep count of its map next to
+    its own. Kernel compilation is timed once on its own, and each case is
+    solved once more before the timed repeats, so the reported sweeps and
+    cell updates per second are steady-state figures.
+    """
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    kernel_backends = [backend for backend in args.backends if backend in KERNEL_WARM_UPS]
+    compile_time = warm_up(kernel_backends) if kernel_backends else None
+    report = {
+        'machine': machine_info(),
+        'seed': args.seed,
+        'repeats': args.repeats,
+        'cell_types': args.cell_types,
+        'compile_time': compile_time,
+        'results': [],
+    }
+    if report['compile_time'] is not None:
+        print(f"compile {report['compile_time']:0.4f}s", file=sys.stderr)
+
+    # Jacobi runs first on every map, so the other modes can be compared with its sweep count
+    modes = ['jacobi'] + [mode for mode in args.modes if mode != 'jacobi']
+    jacobi_sweeps = {}
+    print(f"{'backend':>10} {'grid':>11} {'density':>7} {'threads':>7} {'mode':>16} {'sweeps':>6} "
+          f"{'jacobi':>6} {'median':>10} {'sweeps/s':>10} {'cells/s':>10}", file=sys.stderr)
+    for backend in args.backends:
+        threads = thread_counts(args.threads) if backend in NUMBA_THREAD_BACKENDS + ('tiled',) else [1]
+        backend_modes = modes if backend in MODE_BACKENDS else ['jacobi']
+        for size in args.sizes:
+            if backend == 'sequential' and size > args.max_sequential_size:
+                continue
+            for density in args.densities:
+                for thread_count in threads:
+                    for mode in backend_modes:
+                        result = run_case(backend, size, density, thread_count, mode, args)
+                        if mode == 'jacobi':
+                            jacobi_sweeps[size, density] = result['sweeps']
+                        result['jacobi_sweeps'] = jacobi_sweeps[size, density]
+                        report['results'].append(result)
+                        print(f"{backend:>10} {size:>5}x{size:<5} {density:>7.2f} {thread_count:>7} {mode:>16} "
+                              f"{result['sweeps']:>6} {result['jacobi_sweeps']:>6} {result['median_time']:>9.4f}s "
+                              f"{result['sweeps_per_second']:>10.1f} {result['cells_per_second']:>10.3g}",
+                              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
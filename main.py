@@ -1,18 +1,29 @@
 """Application for Parallel Mouse Simulation."""
+import os
 import sys
+import threading
 import time
 from dataclasses import dataclass
 from enum import Enum
 import numpy as np
-from numba import jit, prange
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QObject, QSize, \
+    QThread, QTimer, Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QColor
 from PyQt5.QtWidgets import QApplication, QLabel, QWidget, QHBoxLayout, \
-    QTableWidget, QVBoxLayout, QPushButton, QCheckBox, QAbstractScrollArea, \
-    QTableWidgetItem
+    QTableView, QVBoxLayout, QPushButton, QCheckBox, QAbstractScrollArea, \
+    QSpinBox, QHeaderView, QStyledItemDelegate, QFileDialog, QMessageBox
 
+# The kernels run outside the main thread, where TBB can hang the process at exit
+os.environ.setdefault('NUMBA_THREADING_LAYER_PRIORITY', 'omp workqueue tbb')
 
-DISCOUNT_FACTOR = 0.90
-DEFAULT_REWARD = 0.04
+# pylint: disable=wrong-import-position
+from solver import DISCOUNT_FACTOR, CELL_REWARDS, CellType, cell_rewards, extract_policy, solve, trace_path
+from solver.cache import SolutionCache, solution_key
+from solver.mapfile import MAP_EXTENSION, load_maps, save_map
+from solver.incremental import incremental_value_iteration
+from solver.parallel import parallel_diagnostics, warm_up
+from solver.progress import SolveCancelled
+from solver.stats import SolveStats
 
 
 class ButtonKey(Enum):
@@ -25,70 +36,118 @@ class ButtonKey(Enum):
     ERASE = 6
 
 
-class CellWidgetType(Enum):
-    """Cell widget constants"""
-    MOUSE = 'MOUSE'
-    REWARD = 'REWARD'
-    FIRE = 'FIRE'
-    ROCK = 'ROCK'
+SPRITE_PIXMAPS = {}
 
+CELL_SPRITES = {
+    CellType.MOUSE: './images/mouse.png',
+    CellType.REWARD: './images/cheese.png',
+    CellType.FIRE: './images/fire.png',
+    CellType.ROCK: './images/rock.png',
+}
 
-class CellRewards(Enum):
-    """Reward value constants"""
-    MOUSE = -0.04
-    REWARD = 1.0
-    FIRE = -3.0
-    ROCK = -0.1
-    EMPTY = -0.04
+CELL_TYPE_ROLE = Qt.UserRole
 
+MAX_GRID_VIEW_SIZE = 800
 
-class Direction(Enum):
-    """Direction constants"""
-    CURRENT = 1
-    UP = 2
-    RIGHT = 3
-    DOWN = 4
-    LEFT = 5
+MAP_FILE_FILTER = f"Mouse maps (*{MAP_EXTENSION})"
 
 
-class MouseWidget(QLabel):
-    """Image of a mouse."""
-    def __init__(self):
-        "Initialize widget."
-        super().__init__()
-        pic = QPixmap('./images/mouse.png')
-        self.setScaledContents(True)
-        self.setPixmap(pic)
-
+def sprite_pixmap(path):
+    """Returns the pixmap of a sprite image, decoding each image file only once."""
+    if path not in SPRITE_PIXMAPS:
+        SPRITE_PIXMAPS[path] = QPixmap(path)
+    return SPRITE_PIXMAPS[path]
 
-class RewardWidget(QLabel):
-    """Image of cheese."""
-    def __init__(self):
-        "Initialize widget."
-        super().__init__()
-        pic = QPixmap('./images/cheese.png')
-        self.setScaledContents(True)
-        self.setPixmap(pic)
 
+class MouseGridModel(QAbstractTableModel):
+    """Table model over a NumPy array of CellType values.
 
-class FireWidget(QLabel):
-    """Image of fire."""
-    def __init__(self):
-        "Initialize widget."
+    The array is the only copy of the map, the view asks for the cells it
+    paints and the solver reads the array directly. While the mouse is
+    animated it is drawn at mouse_location instead of its start cell, and
+    the cells it has visited are marked in trail.
+    """
+    def __init__(self, cells):
+        """Initialize model."""
         super().__init__()
-        pic = QPixmap('./images/fire.png')
-        self.setScaledContents(True)
-        self.setPixmap(pic)
-
-
-class RockWidget(QLabel):
-    """Image of a rock."""
-    def __init__(self):
-        "Initialize widget."
-        super().__init__()
-        pic = QPixmap('./images/rock.png')
-        self.setScaledContents(True)
-        self.setPixmap(pic)
+        self.cells = cells
+        self.trail = np.zeros(cells.shape, dtype=bool)
+        self.mouse_location = None
+
+    def rowCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Number of grid rows."""
+        return 0 if parent.isValid() else self.cells.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Number of grid columns."""
+        return 0 if parent.isValid() else self.cells.shape[1]
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Cell type to draw and background color of a cell."""
+        if not index.isValid():
+            return None
+
+        row, column = index.row(), index.column()
+        if role == CELL_TYPE_ROLE:
+            if self.mouse_location is not None:
+                if (row, column) == self.mouse_location:
+                    return CellType.MOUSE
+                if self.cells[row, column] == CellType.MOUSE:
+                    return CellType.EMPTY
+            return CellType(self.cells[row, column])
+        if role == Qt.BackgroundRole:
+            return QColor(255, 255, 204) if self.trail[row, column] else QColor(255, 255, 255)
+        return None
+
+    def set_cell(self, row, column, cell_type):
+        """Changes the type of a single cell."""
+        self.cells[row, column] = cell_type
+        self.cell_changed(row, column)
+
+    def set_cells(self, cells):
+        """Replaces the whole map."""
+        self.beginResetModel()
+        self.cells = cells
+        self.trail = np.zeros(cells.shape, dtype=bool)
+        self.mouse_location = None
+        self.endResetModel()
+
+    def move_mouse(self, row, column):
+        """Draws the mouse at a cell and adds the cell to its trail."""
+        if self.mouse_location is not None:
+            self.cell_changed(*self.mouse_location)
+        self.mouse_location = (row, column)
+        self.trail[row, column] = True
+        self.cell_changed(row, column)
+
+    def clear_path(self):
+        """Puts the mouse back on its start cell and clears its trail."""
+        self.trail[...] = False
+        self.mouse_location = None
+        self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1))
+
+    def cell_changed(self, row, column):
+        """Lets the view repaint a cell."""
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index)
+
+
+class MouseGridView(QTableView):
+    """Table view that scrolls large grids instead of growing the window to fit them."""
+    def sizeHint(self):  # pylint: disable=invalid-name
+        """Size of the whole grid, up to MAX_GRID_VIEW_SIZE on each side."""
+        return super().sizeHint().boundedTo(QSize(MAX_GRID_VIEW_SIZE, MAX_GRID_VIEW_SIZE))
+
+
+class CellDelegate(QStyledItemDelegate):
+    """Paints grid cells from the cell types of a MouseGridModel."""
+    def paint(self, painter, option, index):
+        """Paints the background and sprite of a cell."""
+        painter.fillRect(option.rect, index.data(Qt.BackgroundRole))
+
+        cell_type = index.data(CELL_TYPE_ROLE)
+        if cell_type in CELL_SPRITES:
+            painter.drawPixmap(option.rect, sprite_pixmap(CELL_SPRITES[cell_type]))
 
 
 @dataclass
@@ -99,9 +158,58 @@ class Coordinates:
         self.column = column
 
 
+class SolverWarmUp(QObject):
+    """Compiles the Numba kernels in a background thread."""
+    finished = pyqtSignal(float)
+
+    def start(self):
+        """Starts compiling without blocking the caller."""
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        """Compiles the kernels and reports how long it took."""
+        self.finished.emit(warm_up())
+
+
+class SolverWorker(QObject):
+    """Runs value iteration in a worker thread with progress and cancellation."""
+    progress = pyqtSignal(int, float)
+    finished = pyqtSignal(object, int)
+    cancelled = pyqtSignal()
+
+    def __init__(self, solve_function):
+        """Wraps a function taking a progress callback and returning (utilities, count)."""
+        super().__init__()
+        self.solve_function = solve_function
+        self.is_cancelled = False
+
+    def run(self):
+        """Solves and reports the result, or that the solve was cancelled."""
+        try:
+            utilities_grid, count = self.solve_function(self.report_progress)
+        except SolveCancelled:
+            self.cancelled.emit()
+            return
+
+        if self.is_cancelled:
+            self.cancelled.emit()
+        else:
+            self.finished.emit(utilities_grid, count)
+
+    def report_progress(self, count, max_util_change):
+        """Forwards solver progress to the GUI and stops the solve if cancelled."""
+        if self.is_cancelled:
+            raise SolveCancelled()
+        self.progress.emit(count, max_util_change)
+
+    def cancel(self):
+        """Asks the solve to stop at its next progress report."""
+        self.is_cancelled = True
+
+
 class App(QWidget):
     """Display window of the main app."""
-    def __init__(self):
+    def __init__(self, warm_up_solver=True):
         """Initialize UI elements."""
         super().__init__()
 
@@ -111,10 +219,35 @@ class App(QWidget):
 
         self.grid_dim = 20
         self.is_parallel_checked = False
+        self.is_auto_checked = False
+        self.is_warm_start_checked = True
+        self.is_diagnostics_checked = False
+        self.is_multigrid_checked = False
+        self.reward_table = CELL_REWARDS
+        self.last_rewards = None
+        self.last_utilities = None
+        self.last_count = 0
+        self.solution_cache = SolutionCache()
+        self.solver_thread = None
+        self.solver_worker = None
+        self.pending_solve = None
+        self.is_closing = False
+        self.solve_start_time = 0
+        self.frame_delay_ms = 300
+        self.animation_timer = QTimer(self)
+        self.animation_timer.timeout.connect(self.on_animation_step)
+        self.animation_path = []
+        self.animation_step = 0
+        self.grid_model = MouseGridModel(self.create_cells())
+        self.is_solver_warm = not warm_up_solver
+        self.solver_warm_up = SolverWarmUp()
+        self.solver_warm_up.finished.connect(self.on_solver_warm_up_finished)
         self.is_mouse_playing = False
         self.play_button = QPushButton("Play Mouse")
+        self.compile_stat_label = QLabel("Numba compile time: not compiled")
         self.time_stat_label = QLabel("Value iteration time: 0s")
         self.iteration_stat_label = QLabel("Iteration count: 0")
+        self.phase_stat_label = QLabel("Setup: 0s, sweeps: 0s, copy: 0s")
         self.mouse_grid = self.create_mouse_grid()
         self.button_panel = self.create_button_panel()
         self.h_box = QHBoxLayout()
@@ -124,19 +257,39 @@ class App(QWidget):
         self.setLayout(self.h_box)
         self.show()
 
+        if warm_up_solver:
+            self.compile_stat_label.setText("Numba compile time: compiling...")
+            self.solver_warm_up.start()
+
     def create_button_panel(self):
         """Creates button panel for user to edit grid."""
         grid_editor_ui = self.create_grid_editor_ui()
         parallel_toggle_ui = self.create_parallel_toggle_ui()
+        auto_toggle_ui = self.create_auto_toggle_ui()
+        warm_start_toggle_ui = self.create_warm_start_toggle_ui()
+        diagnostics_toggle_ui = self.create_diagnostics_toggle_ui()
+        multigrid_toggle_ui = self.create_multigrid_toggle_ui()
+        frame_delay_ui = self.create_frame_delay_ui()
+        grid_size_ui = self.create_grid_size_ui()
+        map_file_ui = self.create_map_file_ui()
 
         self.play_button.setToolTip("This will start the mouse pathing")
         self.play_button.clicked.connect(self.on_click_play)
 
         v_box = QVBoxLayout()
         v_box.addLayout(grid_editor_ui)
+        v_box.addLayout(grid_size_ui)
+        v_box.addLayout(map_file_ui)
         v_box.addWidget(parallel_toggle_ui)
+        v_box.addWidget(auto_toggle_ui)
+        v_box.addWidget(warm_start_toggle_ui)
+        v_box.addWidget(diagnostics_toggle_ui)
+        v_box.addWidget(multigrid_toggle_ui)
+        v_box.addLayout(frame_delay_ui)
+        v_box.addWidget(self.compile_stat_label)
         v_box.addWidget(self.time_stat_label)
         v_box.addWidget(self.iteration_stat_label)
+        v_box.addWidget(self.phase_stat_label)
         v_box.addWidget(self.play_button)
         return v_box
 
@@ -187,39 +340,118 @@ class App(QWidget):
 
         return parallel_check_box
 
-    def create_mouse_grid(self):
-        """Create the grid for the mouse and the obstacles."""
-        grid = QTableWidget()
-        grid.setRowCount(self.grid_dim)
-        grid.setColumnCount(self.grid_dim)
-        grid.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
-        grid.horizontalHeader().hide()
-        grid.verticalHeader().hide()
-        grid.clicked.connect(self.on_click_grid_cell)
-
-        for y_index in range(self.grid_dim):
-            for x_index in range (self.grid_dim):
-                blank_widget = QTableWidgetItem('')
-                blank_widget.setWhatsThis('Blank')
-                grid.setItem(x_index, y_index, blank_widget)
-                grid.setColumnWidth(x_index, 30)
-                grid.setRowHeight(y_index, 30)
+    def create_auto_toggle_ui(self):
+        """Creates automatic backend display UI layout."""
+        auto_check_box = QCheckBox("Auto")
+        auto_check_box.setToolTip("If checked, the algorithm runs sequentially, vectorized or in parallel depending on the grid size, overriding Parallel")
+        auto_check_box.stateChanged.connect(self.on_click_auto_check)
+
+        return auto_check_box
+
+    def create_warm_start_toggle_ui(self):
+        """Creates warm start display UI layout."""
+        warm_start_check_box = QCheckBox("Warm Start")
+        warm_start_check_box.setToolTip("If checked, runs after the first one use the incremental NumPy solver instead of the chosen backend, starting from the last solution and only updating cells affected by grid edits")
+        warm_start_check_box.setChecked(self.is_warm_start_checked)
+        warm_start_check_box.stateChanged.connect(self.on_click_warm_start_check)
+
+        return warm_start_check_box
+
+    def create_diagnostics_toggle_ui(self):
+        """Creates diagnostics display UI layout."""
+        diagnostics_check_box = QCheckBox("Diagnostics")
+        diagnostics_check_box.setToolTip("If checked, the stats of every full solve and the Numba parallel diagnostics are printed to the console")
+        diagnostics_check_box.stateChanged.connect(self.on_click_diagnostics_check)
+
+        return diagnostics_check_box
+
+    def create_multigrid_toggle_ui(self):
+        """Creates multigrid display UI layout."""
+        multigrid_check_box = QCheckBox("Multigrid")
+        multigrid_check_box.setToolTip("If checked, full solves run Gauss-Seidel sweeps, starting from the "
+                                       "solution of coarser copies of the grid")
+        multigrid_check_box.stateChanged.connect(self.on_click_multigrid_check)
+
+        return multigrid_check_box
+
+    def create_frame_delay_ui(self):
+        """Creates animation frame delay UI layout."""
+        frame_delay_label = QLabel("Frame delay")
+
+        frame_delay_spin_box = QSpinBox()
+        frame_delay_spin_box.setToolTip("Time the mouse waits on each cell, 0 moves it as fast as possible")
+        frame_delay_spin_box.setRange(0, 2000)
+        frame_delay_spin_box.setSingleStep(50)
+        frame_delay_spin_box.setSuffix(" ms")
+        frame_delay_spin_box.setValue(self.frame_delay_ms)
+        frame_delay_spin_box.valueChanged.connect(self.on_change_frame_delay)
+
+        h_box = QHBoxLayout()
+        h_box.addWidget(frame_delay_label)
+        h_box.addWidget(frame_delay_spin_box)
+        return h_box
+
+    def create_grid_size_ui(self):
+        """Creates grid size UI layout."""
+        grid_size_label = QLabel("Grid size")
+
+        self.grid_size_spin_box = QSpinBox()
+        self.grid_size_spin_box.setToolTip("This will clear the grid and resize it to the given number of rows and columns")
+        self.grid_size_spin_box.setRange(2, 1000)
+        self.grid_size_spin_box.setValue(self.grid_dim)
+        self.grid_size_spin_box.setKeyboardTracking(False)
+        self.grid_size_spin_box.valueChanged.connect(self.on_change_grid_size)
+
+        h_box = QHBoxLayout()
+        h_box.addWidget(grid_size_label)
+        h_box.addWidget(self.grid_size_spin_box)
+        return h_box
+
+    def create_map_file_ui(self):
+        """Creates map file UI layout."""
+        open_map_button = QPushButton("Open Map")
+        open_map_button.setToolTip("This will replace the grid with the first map of a map file, and its stored solution if it has one")
+        open_map_button.clicked.connect(self.on_click_open_map)
+
+        save_map_button = QPushButton("Save Map")
+        save_map_button.setToolTip("This will save the grid to a map file, together with its solution if it was solved")
+        save_map_button.clicked.connect(self.on_click_save_map)
+
+        h_box = QHBoxLayout()
+        h_box.addWidget(open_map_button)
+        h_box.addWidget(save_map_button)
+        return h_box
+
+    def create_cells(self):
+        """Creates an empty map with the mouse and the reward in opposite corners."""
+        cells = np.full((self.grid_dim, self.grid_dim), CellType.EMPTY, dtype=np.uint8)
 
         # Add mouse to grid
-        mouse_widget = MouseWidget()
-        mouse_widget.setWhatsThis(CellWidgetType.MOUSE.name)
-        grid.setCellWidget(0, 0, mouse_widget)
+        cells[0, 0] = CellType.MOUSE
         self.mouse_coordinates.row = 0
         self.mouse_coordinates.column = 0
 
-
         # Add reward to grid
-        reward_widget = RewardWidget()
-        reward_widget.setWhatsThis(CellWidgetType.REWARD.name)
-        grid.setCellWidget(self.grid_dim - 1, self.grid_dim - 1, reward_widget)
+        cells[self.grid_dim - 1, self.grid_dim - 1] = CellType.REWARD
         self.reward_coordinates.row = self.grid_dim - 1
         self.reward_coordinates.column = self.grid_dim - 1
 
+        return cells
+
+    def create_mouse_grid(self):
+        """Create the grid for the mouse and the obstacles."""
+        grid = MouseGridView()
+        grid.setModel(self.grid_model)
+        grid.setItemDelegate(CellDelegate(grid))
+        grid.setSelectionMode(MouseGridView.NoSelection)
+        grid.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
+        for header in (grid.horizontalHeader(), grid.verticalHeader()):
+            header.hide()
+            header.setMinimumSectionSize(1)
+            header.setDefaultSectionSize(30)
+            header.setSectionResizeMode(QHeaderView.Fixed)
+        grid.clicked.connect(self.on_click_grid_cell)
+
         return grid
 
     def on_click_mouse_move(self):
@@ -247,13 +479,9 @@ class App(QWidget):
         self.button_selected = ButtonKey.NONE
 
         if not self.is_mouse_playing:
-            for y_index in range(self.grid_dim):
-                for x_index in range (self.grid_dim):
-                    cell_widget = self.mouse_grid.cellWidget(x_index, y_index)
-                    if (cell_widget and
-                        (cell_widget.whatsThis() == CellWidgetType.ROCK.name or
-                        cell_widget.whatsThis() == CellWidgetType.FIRE.name)):
-                        self.mouse_grid.removeCellWidget(x_index, y_index)
+            cells = self.grid_model.cells.copy()
+            cells[(cells == CellType.ROCK) | (cells == CellType.FIRE)] = CellType.EMPTY
+            self.grid_model.set_cells(cells)
 
     def on_click_play(self):
         """Starts the search to find the best path"""
@@ -261,290 +489,325 @@ class App(QWidget):
             self.play_button.setText("Start Mouse")
             self.play_button.repaint()
             self.is_mouse_playing = False
+            self.pending_solve = None
+            if self.solver_worker:
+                self.solver_worker.cancel()
             self.reset_grid()
         else:
             self.play_button.setText("Stop Mouse")
             self.play_button.repaint()
             self.is_mouse_playing = True
 
-            if self.is_parallel_checked:
-                current_grid_rewards = self.generate_numpy_matrix()
-
-                start_time = time.perf_counter()
-                utilities_grid, count = parallel_value_iteration(current_grid_rewards)
-                parallel_value_iteration.parallel_diagnostics(level=4)
-                total_time = time.perf_counter() - start_time
-
-                self.time_stat_label.setText(f"Value iteration time: {total_time:0.4f}s")
-                self.iteration_stat_label.setText(f"Iteration count: {count}")
-                self.time_stat_label.repaint()
-                self.iteration_stat_label.repaint()
-
-                self.animate_mouse(utilities_grid)
+            current_grid_cells = self.grid_model.cells.copy()
+            current_grid_rewards = self.generate_numpy_matrix()
+
+            backend_options = {}
+            if self.is_auto_checked:
+                backend = 'auto'
+                # Don't pick the kernels still compiling in the background
+                backend_options['allow_parallel'] = self.is_solver_warm
+            elif self.is_parallel_checked and not self.is_solver_warm:
+                # Don't wait for the kernels still compiling in the background
+                backend = 'vectorized'
+            elif self.is_parallel_checked:
+                backend = 'parallel'
             else:
-                current_grid_rewards = self.generate_numpy_matrix()
-
-                start_time = time.perf_counter()
-                utilities_grid, count = seq_value_iteration(current_grid_rewards)
-                total_time = time.perf_counter() - start_time
-
-                self.time_stat_label.setText(f"Value iteration time: {total_time:0.4f}s")
-                self.iteration_stat_label.setText(f"Iteration count: {count}")
-                self.time_stat_label.repaint()
-                self.iteration_stat_label.repaint()
+                backend = 'sequential'
+            if self.is_multigrid_checked:
+                # Jacobi sweeps barely gain from the coarse warm start
+                backend_options['multigrid'] = True
+                backend_options['mode'] = 'gauss_seidel'
+            cache_key = solution_key(current_grid_rewards, backend)
+
+            self.solve_start_time = time.perf_counter()
+            cached_solution = self.solution_cache.get(cache_key)
+            if cached_solution is not None:
+                self.on_solve_finished(current_grid_rewards, backend, cache_key, 'cache', *cached_solution)
+            elif self.is_warm_start_checked and self.last_utilities is not None:
+                dirty_cells = np.argwhere(current_grid_rewards != self.last_rewards)
+                last_utilities = self.last_utilities
+                self.start_solver(
+                    lambda progress: incremental_value_iteration(current_grid_cells, last_utilities, dirty_cells, progress,
+                                                                 reward_table=self.reward_table),
+                    lambda utilities_grid, count: self.on_solve_finished(current_grid_rewards, 'incremental', cache_key, 'warm', utilities_grid, count))
+            else:
+                stats = SolveStats(backend)
+                self.start_solver(
+                    lambda progress: solve(current_grid_cells, backend, self.reward_table, progress=progress, stats=stats,
+                                           **backend_options),
+                    lambda utilities_grid, count: self.on_solve_finished(current_grid_rewards, backend, cache_key, 'cold', utilities_grid, count, stats))
+
+    def start_solver(self, solve_function, on_finished):
+        """Runs a solve in a worker thread, streaming its progress to the stat labels
+
+        While a cancelled solve is still running, up to its next progress
+        report, the new solve waits for its thread to finish instead of
+        blocking the window.
+        """
+        if self.solver_thread:
+            self.pending_solve = (solve_function, on_finished)
+            return
+
+        solver_thread = QThread()
+        self.solver_thread = solver_thread
+        self.solver_worker = SolverWorker(solve_function)
+        self.solver_worker.moveToThread(self.solver_thread)
+        self.solver_thread.started.connect(self.solver_worker.run)
+        self.solver_worker.progress.connect(self.on_solve_progress)
+        self.solver_worker.finished.connect(on_finished)
+        # Quit from the worker thread itself, without a round trip through the GUI thread
+        self.solver_worker.finished.connect(self.solver_thread.quit, Qt.DirectConnection)
+        self.solver_worker.cancelled.connect(self.on_solve_cancelled)
+        self.solver_worker.cancelled.connect(self.solver_thread.quit, Qt.DirectConnection)
+        self.solver_thread.finished.connect(lambda: self.on_solver_thread_finished(solver_thread))
+        self.solver_thread.start()
+
+    def on_solve_progress(self, count, max_util_change):
+        """Shows the progress of a running solve"""
+        total_time = time.perf_counter() - self.solve_start_time
+        self.time_stat_label.setText(f"Value iteration time: {total_time:0.4f}s")
+        self.iteration_stat_label.setText(f"Iteration count: {count} (max change {max_util_change:0.2e})")
+
+    def on_solve_cancelled(self):
+        """Reports that the running solve was stopped"""
+        self.iteration_stat_label.setText("Iteration count: cancelled")
+
+    def on_solver_thread_finished(self, solver_thread):
+        """Releases the worker once its thread has stopped, then starts the solve waiting for it"""
+        if self.solver_thread is solver_thread:
+            self.solver_thread = None
+            self.solver_worker = None
+        if self.is_closing:
+            self.close()
+        elif self.pending_solve:
+            pending_solve = self.pending_solve
+            self.pending_solve = None
+            self.start_solver(*pending_solve)
+
+    def on_solve_finished(self, rewards, backend, cache_key, source, utilities_grid, count, stats=None):
+        """Shows the solve stats and animates the mouse along the best path
+
+        source is 'cold' for a full solve, 'warm' for a warm-started one and
+        'cache' when the solution was cached. backend names the solver in the
+        time label, which is 'incremental' for warm-started solves. stats
+        holds the SolveStats of a full solve.
+        """
+        total_time = time.perf_counter() - self.solve_start_time
+
+        if stats is not None:
+            self.phase_stat_label.setText(
+                f"Setup: {stats.setup_time:0.4f}s, sweeps: {stats.sweep_time:0.4f}s, "
+                f"copy: {stats.copy_time:0.4f}s ({stats.threads} threads)")
+            if self.is_diagnostics_checked:
+                self.print_diagnostics(stats)
+        if source == 'cold':
+            self.solution_cache.put(cache_key, utilities_grid, count)
+
+        self.last_rewards = rewards
+        self.last_utilities = utilities_grid
+        self.last_count = count
+
+        if stats is not None and stats.backend != backend:
+            # The automatic backend records the backend it picked
+            backend = f"{backend}: {stats.backend}"
+        self.time_stat_label.setText(f"Value iteration time ({backend}): {total_time:0.4f}s")
+        source_text = {'cache': " (cached)", 'warm': " (incremental)"}.get(source, "")
+        self.iteration_stat_label.setText(f"Iteration count: {count}{source_text}")
+        self.time_stat_label.repaint()
+        self.iteration_stat_label.repaint()
 
-                self.animate_mouse(utilities_grid)
+        if self.is_mouse_playing:
+            self.animate_mouse(utilities_grid)
+
+    def print_diagnostics(self, stats):
+        """Prints the stats of a solve, and the Numba parallel diagnostics of the parallel kernel"""
+        print(stats)
+        print("Residuals:", " ".join(f"{residual:0.2e}" for residual in stats.residuals))
+        if stats.backend == 'parallel':
+            # Compiling the kernel afresh takes a while, so it is left to a background thread
+            threading.Thread(target=self.print_parallel_diagnostics, daemon=True).start()
+
+    def print_parallel_diagnostics(self):
+        """Prints the Numba parallel diagnostics of the parallel kernel"""
+        if not parallel_diagnostics():
+            print("No parallel diagnostics, the parallel kernel has not been compiled")
+
+    def closeEvent(self, event):  # pylint: disable=invalid-name
+        """Stops a running solve, and closes the window once its thread has finished"""
+        if self.solver_thread:
+            self.is_closing = True
+            self.pending_solve = None
+            self.solver_worker.cancel()
+            self.hide()
+            event.ignore()
+            return
+        super().closeEvent(event)
 
     def reset_grid(self):
         """Resets the grid back to the original setup"""
-        for y_index in range(self.grid_dim):
-            for x_index in range (self.grid_dim):
-                self.mouse_grid.item(x_index, y_index).setBackground(QColor(255, 255, 255))
-
-                cell_widget = self.mouse_grid.cellWidget(x_index, y_index)
-                if cell_widget and cell_widget.whatsThis() == CellWidgetType.MOUSE.name:
-                    self.mouse_grid.removeCellWidget(x_index, y_index)
-
-        # Add mouse to grid
-        mouse_widget = MouseWidget()
-        mouse_widget.setWhatsThis(CellWidgetType.MOUSE.name)
-        self.mouse_grid.setCellWidget(self.mouse_coordinates.row, self.mouse_coordinates.column, mouse_widget)
-
-        # Add reward to grid
-        reward_widget = RewardWidget()
-        reward_widget.setWhatsThis(CellWidgetType.REWARD.name)
-        self.mouse_grid.setCellWidget(self.reward_coordinates.row, self.reward_coordinates.column, reward_widget)
+        self.animation_timer.stop()
+        self.grid_model.clear_path()
 
     def animate_mouse(self, utilities_grid):
-        """Moves the mouse from cell to cell using the best path"""
-        current_mouse_location = Coordinates(self.mouse_coordinates.row, self.mouse_coordinates.column)
-
-        while self.is_mouse_playing:
-            max_cell_value = utilities_grid[current_mouse_location.row, current_mouse_location.column]
-            max_cell_direction = Direction.CURRENT
-
-            if (current_mouse_location.row - 1 >= 0 and
-                utilities_grid[current_mouse_location.row - 1, current_mouse_location.column] > max_cell_value and
-                utilities_grid[current_mouse_location.row - 1, current_mouse_location.column] != CellRewards.ROCK.value):
-                max_cell_value = utilities_grid[current_mouse_location.row - 1, current_mouse_location.column]
-                max_cell_direction = Direction.UP
-            
-            if (current_mouse_location.row + 1 < self.grid_dim and
-                utilities_grid[current_mouse_location.row + 1, current_mouse_location.column] > max_cell_value and
-                utilities_grid[current_mouse_location.row + 1, current_mouse_location.column] != CellRewards.ROCK.value):
-                max_cell_value = utilities_grid[current_mouse_location.row + 1, current_mouse_location.column]
-                max_cell_direction = Direction.DOWN
-            
-            if (current_mouse_location.column - 1 >= 0 and
-                utilities_grid[current_mouse_location.row, current_mouse_location.column - 1] > max_cell_value and
-                utilities_grid[current_mouse_location.row, current_mouse_location.column - 1] != CellRewards.ROCK.value):
-                max_cell_value = utilities_grid[current_mouse_location.row, current_mouse_location.column - 1]
-                max_cell_direction = Direction.LEFT
-
-            if (current_mouse_location.column + 1 < self.grid_dim and
-                utilities_grid[current_mouse_location.row, current_mouse_location.column + 1] > max_cell_value and
-                utilities_grid[current_mouse_location.row, current_mouse_location.column + 1] != CellRewards.ROCK.value):
-                max_cell_value = utilities_grid[current_mouse_location.row, current_mouse_location.column + 1]
-                max_cell_direction = Direction.RIGHT
-
-            self.mouse_grid.item(current_mouse_location.row, current_mouse_location.column).setBackground(QColor(255, 255, 204))
-            self.mouse_grid.removeCellWidget(current_mouse_location.row, current_mouse_location.column)
-            new_mouse_widget = MouseWidget()
-            new_mouse_widget.setWhatsThis(CellWidgetType.MOUSE.name)
-
-            if max_cell_direction == Direction.UP:
-                self.mouse_grid.setCellWidget(current_mouse_location.row - 1, current_mouse_location.column, new_mouse_widget)
-                current_mouse_location = Coordinates(current_mouse_location.row - 1, current_mouse_location.column)
-            elif max_cell_direction == Direction.DOWN:
-                self.mouse_grid.setCellWidget(current_mouse_location.row + 1, current_mouse_location.column, new_mouse_widget)
-                current_mouse_location = Coordinates(current_mouse_location.row + 1, current_mouse_location.column)
-            elif max_cell_direction == Direction.LEFT:
-                self.mouse_grid.setCellWidget(current_mouse_location.row, current_mouse_location.column - 1, new_mouse_widget)
-                current_mouse_location = Coordinates(current_mouse_location.row, current_mouse_location.column - 1)
-            elif max_cell_direction == Direction.RIGHT:
-                self.mouse_grid.setCellWidget(current_mouse_location.row, current_mouse_location.column + 1, new_mouse_widget)
-                current_mouse_location = Coordinates(current_mouse_location.row, current_mouse_location.column + 1)
-            else:
-                self.mouse_grid.setCellWidget(current_mouse_location.row, current_mouse_location.column, new_mouse_widget)
-                break
+        """Starts moving the mouse from cell to cell using the best path"""
+        cells = self.grid_model.cells
+        start = (self.mouse_coordinates.row, self.mouse_coordinates.column)
+        self.animation_path, _ = trace_path(extract_policy(utilities_grid, cells), cells, start)
+        self.animation_step = 0
+        self.grid_model.move_mouse(*self.animation_path[0])
+
+        self.animation_timer.start(self.frame_delay_ms)
+
+    def on_animation_step(self):
+        """Moves the mouse one cell along the best path"""
+        self.animation_step += 1
+        if not self.is_mouse_playing or self.animation_step >= len(self.animation_path):
+            self.animation_timer.stop()
+            return
+
+        self.grid_model.move_mouse(*self.animation_path[self.animation_step])
+
+    def on_change_frame_delay(self, frame_delay_ms):
+        """Sets how long the mouse waits on each cell of its path"""
+        self.frame_delay_ms = frame_delay_ms
+        self.animation_timer.setInterval(frame_delay_ms)
+
+    def on_change_grid_size(self, grid_dim):
+        """Replaces the grid with an empty one of the given size"""
+        if self.is_mouse_playing:
+            return
 
-            app.processEvents()
-            time.sleep(0.3)
+        self.grid_dim = grid_dim
+        self.last_rewards = None
+        self.last_utilities = None
+        self.grid_model.set_cells(self.create_cells())
+
+    def on_click_open_map(self):
+        """Asks for a map file and opens it"""
+        if self.is_mouse_playing:
+            return
+
+        path, _ = QFileDialog.getOpenFileName(self, "Open Map", "", MAP_FILE_FILTER)
+        if path:
+            try:
+                self.open_map(path)
+            except (OSError, ValueError) as error:
+                QMessageBox.warning(self, "Open Map", f"Could not open {path}: {error}")
+
+    def on_click_save_map(self):
+        """Asks for a map file name and saves the grid to it"""
+        path, _ = QFileDialog.getSaveFileName(self, "Save Map", f"map{MAP_EXTENSION}", MAP_FILE_FILTER)
+        if path:
+            try:
+                self.save_map(path)
+            except OSError as error:
+                QMessageBox.warning(self, "Save Map", f"Could not save {path}: {error}")
+
+    def open_map(self, path):
+        """Replaces the grid with the first map of a map file
+
+        The map's reward table is used for later solves, and its stored
+        utilities, if any, become the solution later runs warm start from.
+        """
+        maps = load_maps(path)
+        if not len(maps):
+            raise ValueError("the file holds no maps")
+        if maps.discount != DISCOUNT_FACTOR:
+            raise ValueError(f"the map was solved with discount factor {maps.discount}, not {DISCOUNT_FACTOR}")
+        cells = np.array(maps.cells[0])
+        mouse_cells = np.argwhere(cells == CellType.MOUSE)
+        reward_cells = np.argwhere(cells == CellType.REWARD)
+        if not len(mouse_cells) or not len(reward_cells):
+            raise ValueError("the map needs a mouse and a reward")
+
+        self.grid_dim = cells.shape[0]
+        self.grid_size_spin_box.blockSignals(True)
+        self.grid_size_spin_box.setValue(self.grid_dim)
+        self.grid_size_spin_box.blockSignals(False)
+        self.mouse_coordinates.row, self.mouse_coordinates.column = mouse_cells[0]
+        self.reward_coordinates.row, self.reward_coordinates.column = reward_cells[0]
+        self.reward_table = maps.reward_table
+        self.grid_model.set_cells(cells)
+
+        if maps.utilities is not None:
+            self.last_rewards = self.generate_numpy_matrix()
+            self.last_utilities = np.array(maps.utilities[0], dtype=np.float64)
+            self.last_count = int(maps.counts[0])
+        else:
+            self.last_rewards = None
+            self.last_utilities = None
+
+    def save_map(self, path):
+        """Saves the grid to a map file, with its solution if the grid was solved as it is"""
+        cells = self.grid_model.cells
+        utilities = policy = None
+        if self.last_utilities is not None and np.array_equal(self.last_rewards, self.generate_numpy_matrix()):
+            utilities = self.last_utilities
+            policy = extract_policy(utilities, cells)
+        save_map(path, cells, self.reward_table, DISCOUNT_FACTOR, utilities, policy, self.last_count)
 
     def on_click_parallel_check(self):
         """Sets whether the best path algorithm will run sequentially or in parallel"""
         self.is_parallel_checked = not self.is_parallel_checked
 
-    def on_click_grid_cell(self):
+    def on_click_auto_check(self):
+        """Sets whether the backend is picked automatically from the grid size"""
+        self.is_auto_checked = not self.is_auto_checked
+
+    def on_solver_warm_up_finished(self, compile_time):
+        """Lets the parallel solver run once its kernels are compiled"""
+        self.is_solver_warm = True
+        self.compile_stat_label.setText(f"Numba compile time: {compile_time:0.4f}s")
+
+    def on_click_warm_start_check(self):
+        """Sets whether value iteration starts from the last solution or from zero"""
+        self.is_warm_start_checked = not self.is_warm_start_checked
+
+    def on_click_diagnostics_check(self):
+        """Sets whether solve stats and parallel diagnostics are printed"""
+        self.is_diagnostics_checked = not self.is_diagnostics_checked
+
+    def on_click_multigrid_check(self):
+        """Sets whether full solves are warm started from coarser copies of the grid"""
+        self.is_multigrid_checked = not self.is_multigrid_checked
+
+    def on_click_grid_cell(self, index):
         """Logic applied to each cell in the grid to determine what happens when a user clicks on the cell"""
         if not self.is_mouse_playing:
-            for grid_item in self.mouse_grid.selectedItems():
-                cell_widget = self.mouse_grid.cellWidget(grid_item.row(), grid_item.column())
-                
-                if self.button_selected == ButtonKey.MOUSE:
-                    if not cell_widget:
-                        # Remove mouse widget
-                        self.mouse_grid.removeCellWidget(self.mouse_coordinates.row, self.mouse_coordinates.column)
-
-                        # Place mouse widget in selected cell
-                        mouse_widget = MouseWidget()
-                        mouse_widget.setWhatsThis(CellWidgetType.MOUSE.name)
-                        self.mouse_grid.setCellWidget(grid_item.row(), grid_item.column(), mouse_widget)
-
-                        # Update mouse widget coordinates
-                        self.mouse_coordinates.row = grid_item.row()
-                        self.mouse_coordinates.column = grid_item.column()
-                elif self.button_selected == ButtonKey.REWARD:
-                    if not cell_widget:
-                        # Remove reward widget
-                        self.mouse_grid.removeCellWidget(self.reward_coordinates.row, self.reward_coordinates.column)
-
-                        # Place reward widget in selected cell
-                        reward_widget = RewardWidget()
-                        reward_widget.setWhatsThis(CellWidgetType.REWARD.name)
-                        self.mouse_grid.setCellWidget(grid_item.row(), grid_item.column(), reward_widget)
-
-                        # Update reward widget coordinates
-                        self.reward_coordinates.row = grid_item.row()
-                        self.reward_coordinates.column = grid_item.column()
-                elif self.button_selected == ButtonKey.FIRE:
-                    if not cell_widget:
-                        fire_widget = FireWidget()
-                        fire_widget.setWhatsThis(CellWidgetType.FIRE.name)
-                        self.mouse_grid.setCellWidget(grid_item.row(), grid_item.column(), fire_widget)
-                elif self.button_selected == ButtonKey.ROCK:
-                    if not cell_widget:
-                        rock_widget = RockWidget()
-                        rock_widget.setWhatsThis(CellWidgetType.ROCK.name)
-                        self.mouse_grid.setCellWidget(grid_item.row(), grid_item.column(), rock_widget)
-                elif self.button_selected == ButtonKey.ERASE:
-                    cell_widget = self.mouse_grid.cellWidget(grid_item.row(), grid_item.column())
-                    
-                    if cell_widget:
-                        if cell_widget.whatsThis() == CellWidgetType.FIRE.name or cell_widget.whatsThis() == CellWidgetType.ROCK.name:
-                            self.mouse_grid.removeCellWidget(grid_item.row(), grid_item.column())
+            row, column = index.row(), index.column()
+            cell_type = self.grid_model.cells[row, column]
+
+            if self.button_selected == ButtonKey.MOUSE:
+                if cell_type == CellType.EMPTY:
+                    # Move mouse to selected cell
+                    self.grid_model.set_cell(self.mouse_coordinates.row, self.mouse_coordinates.column, CellType.EMPTY)
+                    self.grid_model.set_cell(row, column, CellType.MOUSE)
+
+                    # Update mouse coordinates
+                    self.mouse_coordinates.row = row
+                    self.mouse_coordinates.column = column
+            elif self.button_selected == ButtonKey.REWARD:
+                if cell_type == CellType.EMPTY:
+                    # Move reward to selected cell
+                    self.grid_model.set_cell(self.reward_coordinates.row, self.reward_coordinates.column, CellType.EMPTY)
+                    self.grid_model.set_cell(row, column, CellType.REWARD)
+
+                    # Update reward coordinates
+                    self.reward_coordinates.row = row
+                    self.reward_coordinates.column = column
+            elif self.button_selected == ButtonKey.FIRE:
+                if cell_type == CellType.EMPTY:
+                    self.grid_model.set_cell(row, column, CellType.FIRE)
+            elif self.button_selected == ButtonKey.ROCK:
+                if cell_type == CellType.EMPTY:
+                    self.grid_model.set_cell(row, column, CellType.ROCK)
+            elif self.button_selected == ButtonKey.ERASE:
+                if cell_type in (CellType.FIRE, CellType.ROCK):
+                    self.grid_model.set_cell(row, column, CellType.EMPTY)
 
     def generate_numpy_matrix(self):
         """Generates a numpy matrix of reward values for the best path algorithm to use"""
-        numpy_array = np.empty((self.grid_dim, self.grid_dim))
-
-        for x in range(self.grid_dim):
-            for y in range(self.grid_dim):
-                cell_widget = self.mouse_grid.cellWidget(x, y)
-                if not cell_widget:
-                    numpy_array[x][y] = CellRewards.EMPTY.value
-                elif cell_widget.whatsThis() == CellWidgetType.MOUSE.name:
-                    numpy_array[x][y] = CellRewards.MOUSE.value
-                elif cell_widget.whatsThis() == CellWidgetType.FIRE.name:
-                    numpy_array[x][y] = CellRewards.FIRE.value
-                elif cell_widget.whatsThis() == CellWidgetType.ROCK.name:
-                    numpy_array[x][y] = CellRewards.ROCK.value
-                elif cell_widget.whatsThis() == CellWidgetType.REWARD.name:
-                    numpy_array[x][y] = CellRewards.REWARD.value
-        return numpy_array
-
-
-def seq_value_iteration(rewards):
-    """Sequential updating of maze cell values sequentially."""
-    dim = rewards.shape[0]
-    maze = np.zeros((dim,dim))
-    temp = maze.copy()
-    max_util_change = 0
-    max_error = 0.0001*(1 - DISCOUNT_FACTOR)/DISCOUNT_FACTOR
-    count = 0
-
-    while True:
-        for row_index in range(dim):
-            for col_index in range(dim):
-                if rewards[row_index, col_index] == -1*DEFAULT_REWARD:
-                    dir_values = []
-                    up_val = maze[row_index, col_index]
-                    down_val = maze[row_index, col_index]
-                    left_val = maze[row_index, col_index]
-                    right_val = maze[row_index, col_index]
-                    if row_index - 1 >= 0 and rewards[row_index - 1, col_index] != CellRewards.ROCK.value:
-                        up_val = maze[row_index - 1, col_index]
-                    if col_index - 1 >= 0 and rewards[row_index, col_index - 1] != CellRewards.ROCK.value:
-                        left_val = maze[row_index, col_index - 1]
-                    if row_index + 1 < dim and rewards[row_index + 1, col_index] != CellRewards.ROCK.value:
-                        down_val = maze[row_index + 1, col_index]
-                    if col_index + 1 < dim and rewards[row_index, col_index + 1] != CellRewards.ROCK.value:
-                        right_val = maze[row_index, col_index + 1]
-                    dir_up_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
-                    dir_left_val = 0.8*left_val + 0.1*up_val + 0.1*down_val
-                    dir_down_val = 0.8*down_val + 0.1*left_val + 0.1*right_val
-                    dir_right_val = 0.8*right_val + 0.1*up_val + 0.1*down_val
-                    dir_values.append(dir_up_val)
-                    dir_values.append(dir_left_val)
-                    dir_values.append(dir_down_val)
-                    dir_values.append(dir_right_val)
-                    final_util = rewards[row_index, col_index] + DISCOUNT_FACTOR*max(dir_values)
-                    temp[row_index, col_index] = final_util
-                    if abs(temp[row_index, col_index] - maze[row_index, col_index]) > max_util_change:
-                        max_util_change = abs(temp[row_index, col_index] - maze[row_index, col_index])
-                else:
-                    temp[row_index, col_index] = rewards[row_index, col_index]
-        count+= 1
-        maze = temp.copy()
-        if max_util_change < max_error:
-            break
-        max_util_change = 0
-
-    return (maze, count)
-
-
-@jit(parallel=True, nopython=True)
-def parallel_value_iteration(rewards):
-    """Parallel updating of maze cell values in parallel."""
-    dim = rewards.shape[0]
-    maze = np.zeros((dim,dim))
-    temp = maze.copy()
-    max_util_change = np.zeros(dim*dim, dtype=np.float64)
-    max_error = 0.0001*(1 - DISCOUNT_FACTOR)/DISCOUNT_FACTOR
-    count = 0
-
-    while True:
-        for row_index in prange(dim):
-            for col_index in prange(dim):
-                if rewards[row_index, col_index] == -1*DEFAULT_REWARD:
-                    dir_values = np.empty((0,0), dtype=np.float64)
-                    up_val = maze[row_index, col_index]
-                    down_val = maze[row_index, col_index]
-                    left_val = maze[row_index, col_index]
-                    right_val = maze[row_index, col_index]
-                    if row_index - 1 >= 0 and rewards[row_index - 1, col_index] != CellRewards.ROCK.value:
-                        up_val = maze[row_index - 1, col_index]
-                    if col_index - 1 >= 0 and rewards[row_index, col_index - 1] != CellRewards.ROCK.value:
-                        left_val = maze[row_index, col_index - 1]
-                    if row_index + 1 < dim and rewards[row_index + 1, col_index] != CellRewards.ROCK.value:
-                        down_val = maze[row_index + 1, col_index]
-                    if col_index + 1 < dim and rewards[row_index, col_index + 1] != CellRewards.ROCK.value:
-                        right_val = maze[row_index, col_index + 1]
-                    dir_up_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
-                    dir_left_val = 0.8*left_val + 0.1*up_val + 0.1*down_val
-                    dir_down_val = 0.8*down_val + 0.1*left_val + 0.1*right_val
-                    dir_right_val = 0.8*right_val + 0.1*up_val + 0.1*down_val
-                    dir_values = np.append(dir_values, dir_up_val)
-                    dir_values = np.append(dir_values, dir_left_val)
-                    dir_values = np.append(dir_values, dir_down_val)
-                    dir_values = np.append(dir_values, dir_right_val)
-
-                    final_util = rewards[row_index, col_index] + DISCOUNT_FACTOR*np.max(dir_values)
-                    temp[row_index, col_index] = final_util
-
-                    max_util_change[dim * row_index + col_index] = abs(temp[row_index, col_index] - maze[row_index, col_index])
-                    
-        for row_index in prange(dim):
-            for col_index in prange(dim):
-                if rewards[row_index, col_index] != -1*DEFAULT_REWARD:
-                    temp[row_index, col_index] = rewards[row_index, col_index]
-
-        count+= 1
-        maze = temp.copy()
-        if len(max_util_change) and np.max(max_util_change) < max_error:
-            break
-
-    return (maze, count)
+        return cell_rewards(self.grid_model.cells, self.reward_table)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,18 @@
+"""Headless value iteration solver for the mouse grid."""
+from solver.constants import DISCOUNT_FACTOR, DEFAULT_REWARD, MAX_ERROR, SOLVE_MODES, \
+    EVALUATION_SWEEPS, CellRewards, CellType, Direction, PathEnd
+from solver.neighbors import NEIGHBOR_SHIFTS, build_neighbor_table
+from solver.grid import GRID_SYMBOLS, GRID_CELL_TYPES, DIRECTION_SHIFTS, CELL_REWARDS, cell_rewards, \
+    grid_cells, parse_grid, load_grid, extract_policy
+from solver.paths import trace_paths, trace_path
+from solver.value_iteration import BACKENDS, DEFAULT_BACKEND, \
+    seq_value_iteration, vectorized_value_iteration, parallel_value_iteration, \
+    batch_value_iteration, solve, solve_with_stats, solve_batch, warm_up
+from solver.incremental import incremental_value_iteration
+from solver.multigrid import coarsen_grid, multigrid_value_iteration
+from solver.sparse import SparseMaze, parse_floorplan, solve_sparse, sparse_value_iteration
+from solver.mapfile import MAP_EXTENSION, MapFile, MapWriter, load_maps, save_map
+from solver.cache import SolutionCache, solution_key
+from solver.tiled import DEFAULT_TILE_SHAPE, split_tiles, tiled_value_iteration
+from solver.progress import PROGRESS_INTERVAL, SolveCancelled
+from solver.stats import SolveStats
@@ -0,0 +1,6 @@
+"""Allows running the solver with `python -m solver`."""
+import sys
+from solver.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,53 @@
+"""Ahead-of-time build of the Numba kernels, run with `python -m solver.aot`."""
+import os
+from numba.pycc import CC
+from solver.parallel import parallel_sweeps, red_black_sweeps, policy_iteration_sweeps, sparse_sweeps, \
+    batch_sweeps
+from solver.reachability import compiled_flood_fill
+
+
+def build(output_dir=os.path.dirname(os.path.abspath(__file__))):
+    """Compiles the kernel extension module into output_dir.
+
+    The solver/_aot_kernels module holds the kernels for both neighbor
+    table index types, and is used with MOUSE_SOLVER_AOT=1. Ahead-of-time
+    compilation does not support parallel loops, so the built kernels sweep
+    on a single thread; in return a fresh process never pays for
+    compilation.
+    """
+    aot_compiler = CC('_aot_kernels')
+    aot_compiler.output_dir = output_dir
+
+    for index_type, index_dtype in (('i4', 'int32'), ('i8', 'int64')):
+        aot_compiler.export(
+            f'parallel_sweeps_{index_dtype}',
+            f'Tuple((f8[::1], f8[::1], i8, f8))'
+            f'(f8[:,::1], none, {index_type}[::1], {index_type}[:,::1], f8[::1], f8[::1], i8, i8, f8[::1])',
+        )(parallel_sweeps.py_func)
+        aot_compiler.export(
+            f'red_black_sweeps_{index_dtype}',
+            f'Tuple((i8, f8))'
+            f'(f8[:,::1], none, {index_type}[::1], {index_type}[:,::1], i8, f8[::1], i8, i8, f8[::1])',
+        )(red_black_sweeps.py_func)
+        aot_compiler.export(
+            f'policy_iteration_sweeps_{index_dtype}',
+            f'Tuple((f8[::1], f8[::1], i8, f8))'
+            f'(f8[:,::1], none, {index_type}[::1], {index_type}[:,::1], f8[::1], f8[::1], i1[::1], i8, i8, i8, f8[::1])',
+        )(policy_iteration_sweeps.py_func)
+        aot_compiler.export(
+            f'sparse_sweeps_{index_dtype}',
+            f'Tuple((f8[::1], f8[::1], i8, f8))'
+            f'(f8[::1], i8[::1], {index_type}[::1], f8[::1], f8[::1], f8[::1], i8, i8, f8[::1])',
+        )(sparse_sweeps.py_func)
+        aot_compiler.export(
+            f'batch_sweeps_{index_dtype}',
+            f'Tuple((f8[:,:,::1], i8[::1]))(f8[:,:,::1], none, {index_type}[::1], {index_type}[:,::1], i8[::1], f8[:,:,::1])',
+        )(batch_sweeps.py_func)
+
+    aot_compiler.export('compiled_flood_fill', 'void(b1[::1], b1[::1], i8, i8)')(compiled_flood_fill.py_func)
+
+    aot_compiler.compile()
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,135 @@
+"""Content-addressed cache of solved grids."""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, MAX_ERROR
+from solver.grid import CELL_REWARDS, is_cell_grid
+from solver.value_iteration import DEFAULT_BACKEND, solve
+
+
+def solution_key(rewards, backend, discount=DISCOUNT_FACTOR, tolerance=MAX_ERROR, reward_table=CELL_REWARDS):
+    """Hashes a rewards matrix or CellType grid together with everything that affects its solution.
+
+    The reward table only affects the solution of CellType grids.
+    """
+    rewards = np.ascontiguousarray(rewards)
+    digest = hashlib.sha256()
+    digest.update(f"{rewards.shape}:{rewards.dtype.str}:{discount!r}:{tolerance!r}:{backend}:".encode())
+    digest.update(rewards.tobytes())
+    if is_cell_grid(rewards):
+        digest.update(np.asarray(reward_table, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class SolutionCache:
+    """Bounded LRU cache of (utilities, count) solutions with an optional disk tier.
+
+    Entries are keyed by solution_key. The in-memory tier holds at most
+    max_entries solutions and evicts the least recently used one. When
+    cache_dir is set every solution is also written there as a .npy file
+    and read back memory-mapped on a memory miss; the disk tier is never
+    evicted. Returned utilities are read-only since they are shared.
+    """
+    def __init__(self, max_entries=128, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """Counters of the cache activity so far."""
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+        }
+
+    def get(self, key):
+        """Returns the cached (utilities, count) for a key, or None."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        solution = self._load(key)
+        if solution is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.disk_hits += 1
+        self._remember(key, solution)
+        return solution
+
+    def put(self, key, utilities, count):
+        """Stores a solution in memory and, if enabled, on disk."""
+        utilities = np.array(utilities)
+        utilities.setflags(write=False)
+        solution = (utilities, count)
+        self._remember(key, solution)
+        self._save(key, solution)
+        return solution
+
+    def solve(self, rewards, backend=DEFAULT_BACKEND, reward_table=CELL_REWARDS):
+        """Solves a rewards matrix or CellType grid, skipping the solver when the solution is cached."""
+        key = solution_key(rewards, backend, reward_table=reward_table)
+        solution = self.get(key)
+        if solution is None:
+            solution = self.put(key, *solve(rewards, backend, reward_table))
+        return solution
+
+    def _remember(self, key, solution):
+        """Adds a solution to the in-memory tier, evicting the oldest entries."""
+        self._entries[key] = solution
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _paths(self, key):
+        """Returns the utilities and metadata file paths for a key."""
+        base_path = os.path.join(self.cache_dir, key)
+        return f"{base_path}.npy", f"{base_path}.json"
+
+    def _load(self, key):
+        """Reads a solution from the disk tier, or returns None."""
+        if not self.cache_dir:
+            return None
+
+        utilities_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as meta_file:
+                count = json.load(meta_file)['count']
+            utilities = np.load(utilities_path, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        return (utilities, count)
+
+    def _save(self, key, solution):
+        """Writes a solution to the disk tier, if enabled."""
+        if not self.cache_dir:
+            return
+
+        utilities, count = solution
+        utilities_path, meta_path = self._paths(key)
+        # Write to temporary files first so readers never see partial entries
+        with open(f"{utilities_path}.tmp", 'wb') as utilities_file:
+            np.save(utilities_file, utilities)
+        os.replace(f"{utilities_path}.tmp", utilities_path)
+        with open(f"{meta_path}.tmp", 'w') as meta_file:
+            json.dump({'count': int(count)}, meta_file)
+        os.replace(f"{meta_path}.tmp", meta_path)
@@ -0,0 +1,118 @@
+"""Command-line entry point for solving grid files without starting Qt."""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from solver.cache import SolutionCache
+from solver.grid import grid_cells, load_grid, extract_policy
+from solver.mapfile import MapWriter
+from solver.value_iteration import BACKENDS, DEFAULT_BACKEND, KERNEL_WARM_UPS, solve_batch, warm_up
+
+# Grids solved and written at a time when streaming into a map file
+MAP_CHUNK_SIZE = 1024
+
+
+def parse_args(argv):
+    """Parses the command-line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='python -m solver',
+        description="Solve mouse grids with value iteration and save the results.")
+    parser.add_argument('grids', nargs='+',
+                        help="grid files to solve (.npy rewards matrices or uint8 cell type grids, (N, H, W) .npy stacks, "
+                             ".mousemap map files or text grids)")
+    parser.add_argument('-b', '--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f"value iteration backend (default: {DEFAULT_BACKEND})")
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help="directory the .npz result files are written to (default: .)")
+    parser.add_argument('--map-output',
+                        help="map file the grids and results of every input are streamed into instead of .npz files")
+    parser.add_argument('--cache-dir',
+                        help="directory of solutions reused across runs for identical grids")
+    parser.add_argument('--cache-size', type=int, default=128,
+                        help="number of solutions kept in memory (default: 128)")
+    return parser.parse_args(argv)
+
+
+def solve_grid_file(path, backend, output_dir, cache):
+    """Solves a single grid file and writes its .npz result file."""
+    start_time = time.perf_counter()
+    rewards, reward_table = load_grid(path)
+    load_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    if rewards.ndim == 3:
+        utilities, count = solve_batch(rewards, backend, reward_table)
+    else:
+        utilities, count = cache.solve(rewards, backend, reward_table)
+    solve_time = time.perf_counter() - start_time
+
+    policy = extract_policy(utilities, rewards)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    output_path = os.path.join(output_dir, f"{name}.npz")
+    np.savez(output_path, utilities=utilities, policy=policy, count=count,
+             load_time=load_time, solve_time=solve_time)
+    return output_path, count, load_time, solve_time
+
+
+def stream_grid_file(path, backend, map_output, writer):
+    """Solves the grids of a file in chunks and appends them to a map file.
+
+    Opens the MapWriter on the first grid file, writer being the one opened
+    so far or None, with the reward table of that file. Every later file
+    must use the same table. Returns the writer, the sweep counts, and the
+    load and solve times.
+    """
+    start_time = time.perf_counter()
+    grids, reward_table = load_grid(path)
+    if grids.ndim == 2:
+        grids = grids[np.newaxis]
+    load_time = time.perf_counter() - start_time
+
+    if writer is None:
+        writer = MapWriter(map_output, grids.shape[1:], reward_table, utilities_dtype=np.float64, policy=True)
+    elif not np.array_equal(writer.reward_table, reward_table):
+        raise ValueError(f"{path} uses another reward table than the grids already in {map_output}")
+    counts = []
+    solve_time = 0
+    for first in range(0, grids.shape[0], MAP_CHUNK_SIZE):
+        # Only one chunk of a memory-mapped input is read into memory at a time
+        chunk = np.ascontiguousarray(grids[first:first + MAP_CHUNK_SIZE])
+        start_time = time.perf_counter()
+        utilities, chunk_counts = solve_batch(chunk, backend, reward_table)
+        solve_time += time.perf_counter() - start_time
+        writer.extend(grid_cells(chunk, reward_table), utilities, extract_policy(utilities, chunk), chunk_counts)
+        counts.append(chunk_counts)
+    writer.flush()
+    return writer, np.concatenate(counts), load_time, solve_time
+
+
+def main(argv=None):
+    """Solves every grid given on the command line."""
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache = SolutionCache(args.cache_size, args.cache_dir)
+
+    if args.backend in KERNEL_WARM_UPS:
+        # Report compilation separately so it does not inflate the first solve time
+        print(f"compile {warm_up([args.backend]):0.4f}s")
+
+    writer = None
+    for path in args.grids:
+        if args.map_output:
+            writer, count, load_time, solve_time = stream_grid_file(path, args.backend, args.map_output, writer)
+            output_path = args.map_output
+        else:
+            output_path, count, load_time, solve_time = solve_grid_file(path, args.backend, args.output_dir, cache)
+        if np.ndim(count):
+            count = f"{np.size(count)} grids, {np.sum(count)}"
+        print(f"{path}: {count} iterations, load {load_time:0.4f}s, "
+              f"solve {solve_time:0.4f}s -> {output_path}")
+    if writer is not None:
+        writer.close()
+
+    stats = cache.stats
+    print(f"cache: {stats['hits']} hits ({stats['disk_hits']} from disk), "
+          f"{stats['misses']} misses, {stats['evictions']} evictions")
+    return 0
@@ -0,0 +1,53 @@
+"""Reward and direction constants shared by the solver and the GUI."""
+from enum import Enum, IntEnum
+import numpy as np
+
+
+DISCOUNT_FACTOR = 0.90
+DEFAULT_REWARD = 0.04
+MAX_ERROR = 0.0001*(1 - DISCOUNT_FACTOR)/DISCOUNT_FACTOR
+
+# Sweep orders of the solvers: two-buffer Jacobi sweeps, in-place red-black
+# Gauss-Seidel sweeps, and modified policy iteration
+SOLVE_MODES = ('jacobi', 'gauss_seidel', 'policy_iteration')
+# Sweeps of the greedy policy between two Bellman sweeps in policy iteration
+EVALUATION_SWEEPS = 4
+
+
+class CellRewards(Enum):
+    """Reward value constants"""
+    MOUSE = -0.04
+    REWARD = 1.0
+    FIRE = -3.0
+    ROCK = -0.1
+    EMPTY = -0.04
+
+
+class CellType(IntEnum):
+    """Cell type constants, stored one byte per cell"""
+    EMPTY = 0
+    MOUSE = 1
+    REWARD = 2
+    FIRE = 3
+    ROCK = 4
+
+
+# Reward of each CellType, indexed by its value
+CELL_REWARDS = np.array([CellRewards[cell_type.name].value for cell_type in CellType])
+
+
+class Direction(Enum):
+    """Direction constants"""
+    CURRENT = 1
+    UP = 2
+    RIGHT = 3
+    DOWN = 4
+    LEFT = 5
+
+
+class PathEnd(Enum):
+    """Path end constants"""
+    REWARD = 1
+    FIRE = 2
+    DEAD_END = 3
+    LOOP = 4
@@ -0,0 +1,167 @@
+"""Automatic backend choice from thresholds calibrated on the local machine."""
+import json
+import os
+from contextlib import contextmanager
+import numpy as np
+from solver.constants import CellRewards
+from solver.prebuilt import numba
+from solver.stats import SolveStats
+
+
+CALIBRATION_VERSION = 2
+CALIBRATION_PATH = os.environ.get(
+    'MOUSE_SOLVER_CALIBRATION',
+    os.path.join(os.path.expanduser('~'), '.cache', 'parallel-mouse-simulator', 'calibration.json'))
+
+# Grid sides each backend is timed at, the sequential one is too slow for larger grids
+CALIBRATION_SIZES = {
+    'sequential': (8, 32),
+    'vectorized': (16, 128),
+    'parallel': (16, 128),
+}
+
+# Free cells each parallel thread should get, fewer threads are used on smaller grids
+CELLS_PER_THREAD = 16384
+
+calibration = None
+
+
+def sweep_cost(backend, backend_function, sizes):
+    """Times a backend on two grid sizes and fits its seconds per sweep as fixed + per_cell*cells.
+
+    backend_function is the value iteration function of the named backend.
+    The parallel backend runs on the thread count choose_backend gives it
+    for each grid size.
+    """
+    points = []
+    for size in sizes:
+        # An empty grid with the cheese in a corner
+        rewards = np.full((size, size), CellRewards.EMPTY.value)
+        rewards[-1, -1] = CellRewards.REWARD.value
+        stats = SolveStats(backend)
+        with use_threads(auto_threads(rewards.size) if backend == 'parallel' else None):
+            backend_function(rewards)
+            backend_function(rewards, stats=stats)
+        points.append((rewards.size, stats.total_time/stats.count))
+
+    (small_cells, small_time), (large_cells, large_time) = points
+    per_cell = max((large_time - small_time)/(large_cells - small_cells), 0.0)
+    fixed = max(small_time - per_cell*small_cells, 0.0)
+    return {'fixed': fixed, 'per_cell': per_cell}
+
+
+def crossover_cells(slower, faster):
+    """Smallest cell count at which the backend with the lower per-cell cost wins, or None if it never does."""
+    if faster['per_cell'] >= slower['per_cell']:
+        return None
+    return int(np.ceil(max(faster['fixed'] - slower['fixed'], 0.0)/(slower['per_cell'] - faster['per_cell'])))
+
+
+def calibrate(backends, path=CALIBRATION_PATH, include_parallel=True, costs=None):
+    """Times the backends, stores the thresholds in path and returns them.
+
+    backends maps backend names to their value iteration functions, of
+    which the sequential, vectorized and parallel ones are timed on a few
+    small grids. Each gets a cost per sweep of fixed + per_cell*cells, and
+    the grid sizes at which the vectorized backend starts to beat the
+    sequential one, and the parallel backend the vectorized one, become the
+    thresholds. The parallel backend is only timed with include_parallel
+    set, and the backends already in costs, from an earlier calibration,
+    are not timed again.
+    """
+    costs = dict(costs or {})
+    for backend, sizes in CALIBRATION_SIZES.items():
+        if backend in backends and backend not in costs and (include_parallel or backend != 'parallel'):
+            costs[backend] = sweep_cost(backend, backends[backend], sizes)
+    result = {
+        'version': CALIBRATION_VERSION,
+        'cpu_count': os.cpu_count(),
+        'max_threads': max_threads(),
+        'costs': costs,
+        'vectorized_min_cells': crossover_cells(costs['sequential'], costs['vectorized']),
+        'parallel_min_cells': (crossover_cells(costs['vectorized'], costs['parallel'])
+                               if 'parallel' in costs else None),
+    }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as calibration_file:
+        json.dump(result, calibration_file, indent=2)
+    return result
+
+
+def load_calibration(backends, path=CALIBRATION_PATH, include_parallel=True):
+    """Returns the stored thresholds, calibrating the backends first if there are none for this machine.
+
+    Thresholds stored on a machine with a different number of cores or
+    Numba threads are calibrated again. Solves that may not use the
+    parallel backend yet, while its kernels still compile, calibrate
+    without it. With include_parallel set, thresholds calibrated without
+    the parallel backend are completed first.
+    """
+    global calibration  # pylint: disable=global-statement
+
+    if calibration is None:
+        try:
+            with open(path) as calibration_file:
+                stored = json.load(calibration_file)
+        except (OSError, ValueError):
+            stored = None
+        if (stored is None or stored.get('version') != CALIBRATION_VERSION or
+                stored.get('cpu_count') != os.cpu_count() or stored.get('max_threads') != max_threads()):
+            stored = calibrate(backends, path, include_parallel)
+        calibration = stored
+    if include_parallel and numba is not None and 'parallel' not in calibration['costs']:
+        calibration = calibrate(backends, path, costs=calibration['costs'])
+    return calibration
+
+
+def max_threads():
+    """Most Numba threads a parallel solve can run on, 1 without Numba."""
+    return numba.config.NUMBA_NUM_THREADS if numba else 1
+
+
+def auto_threads(cell_count):
+    """Numba threads the automatic backend gives a parallel solve of cell_count cells."""
+    return min(max_threads(), max(1, cell_count//CELLS_PER_THREAD))
+
+
+def choose_backend(cell_count, backends, allow_sequential=True, allow_parallel=True):
+    """Picks the backend for a grid of cell_count cells and the thread count it should use.
+
+    backends maps backend names to their value iteration functions, which
+    are timed if the thresholds have to be calibrated. The thread count is
+    None for backends that do not use Numba threads.
+    """
+    thresholds = load_calibration(backends, include_parallel=allow_parallel)
+    parallel_min_cells = thresholds['parallel_min_cells']
+    vectorized_min_cells = thresholds['vectorized_min_cells']
+
+    if allow_parallel and numba is not None and parallel_min_cells is not None and cell_count >= parallel_min_cells:
+        return ('parallel', auto_threads(cell_count))
+    if not allow_sequential or (vectorized_min_cells is not None and cell_count >= vectorized_min_cells):
+        return ('vectorized', None)
+    return ('sequential', None)
+
+
+@contextmanager
+def use_threads(threads):
+    """Runs the calling thread's parallel solves in the body on threads Numba threads.
+
+    The previous thread count is restored on the way out. None leaves the
+    thread count as it is.
+    """
+    if threads is None:
+        yield
+        return
+    previous_threads = numba.get_num_threads()
+    numba.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        numba.set_num_threads(previous_threads)
+
+
+if __name__ == '__main__':
+    # Recalibrates and prints the thresholds
+    from solver.value_iteration import BACKENDS
+    print(json.dumps(calibrate(BACKENDS), indent=2))
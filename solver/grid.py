@@ -0,0 +1,162 @@
+"""Grid file loading and policy extraction without any Qt dependency."""
+import numpy as np
+from solver.constants import CELL_REWARDS, DEFAULT_REWARD, DISCOUNT_FACTOR, CellRewards, CellType, Direction
+from solver.mapfile import MAP_EXTENSION, load_maps
+
+
+GRID_SYMBOLS = {
+    '.': CellRewards.EMPTY,
+    'M': CellRewards.MOUSE,
+    'C': CellRewards.REWARD,
+    'F': CellRewards.FIRE,
+    '#': CellRewards.ROCK,
+}
+# Cell type of each symbol, CellRewards cannot tell mouse and empty cells apart
+GRID_CELL_TYPES = {
+    '.': CellType.EMPTY,
+    'M': CellType.MOUSE,
+    'C': CellType.REWARD,
+    'F': CellType.FIRE,
+    '#': CellType.ROCK,
+}
+# Row and column offsets of a move in each direction
+DIRECTION_SHIFTS = {
+    Direction.CURRENT: (0, 0),
+    Direction.UP: (-1, 0),
+    Direction.RIGHT: (0, 1),
+    Direction.DOWN: (1, 0),
+    Direction.LEFT: (0, -1),
+}
+
+
+def cell_rewards(cells, reward_table=CELL_REWARDS):
+    """Builds a rewards matrix from a grid of CellType values."""
+    return reward_table[cells]
+
+
+def is_cell_grid(grid):
+    """Whether a grid holds CellType values rather than rewards."""
+    return grid.dtype == np.uint8
+
+
+def grid_rewards(grid, reward_table=CELL_REWARDS):
+    """Returns the rewards matrix of a CellType grid, or a rewards matrix as is."""
+    return cell_rewards(grid, reward_table) if is_cell_grid(grid) else grid
+
+
+def grid_cells(grid, reward_table=CELL_REWARDS):
+    """Returns a CellType grid as is, or the CellType grid of a rewards matrix.
+
+    Cells of a rewards matrix take the first cell type with their reward in
+    reward_table, so mouse cells, which have the empty cell reward, become
+    empty cells.
+    """
+    if is_cell_grid(grid):
+        return grid
+    cells = np.full(grid.shape, len(reward_table), dtype=np.uint8)
+    for cell_type in reversed(CellType):
+        cells[grid == reward_table[cell_type]] = cell_type
+    if np.any(cells == len(reward_table)):
+        raise ValueError("Rewards matrix holds rewards that are not in the reward table")
+    return cells
+
+
+def cell_masks(grid):
+    """Returns the free cell and rock masks of a rewards matrix or a CellType grid.
+
+    Cells of a CellType grid are classified by their type. A rewards matrix
+    only has its rewards to go by, so a cell is free when it holds the
+    empty cell reward and a rock when it holds the rock reward.
+    """
+    if is_cell_grid(grid):
+        return ((grid == CellType.EMPTY) | (grid == CellType.MOUSE), grid == CellType.ROCK)
+    return (grid == -1*DEFAULT_REWARD, grid == CellRewards.ROCK.value)
+
+
+def start_utilities(fixed_utilities, free_cells, mode, dtype=np.float64, initial_utilities=None):
+    """Flat utilities a solve starts from, other than a cold Jacobi solve.
+
+    The cells that are not swept hold their fixed utilities from the start.
+    The free cells take their initial_utilities when given, a warm start.
+    Otherwise Gauss-Seidel starts them at zero, and policy iteration at a
+    bound below every utility, which no Bellman update can lower, so the
+    utilities rise monotonically however poor the early policies are.
+    """
+    utilities = fixed_utilities.ravel().astype(dtype)
+    if initial_utilities is not None:
+        utilities[free_cells] = np.ravel(initial_utilities)[free_cells]
+    elif mode == 'policy_iteration' and free_cells.size:
+        utilities[free_cells] = min(utilities[free_cells].min()/(1 - DISCOUNT_FACTOR), utilities.min())
+    else:
+        utilities[free_cells] = 0
+    return utilities
+
+
+def parse_grid(text):
+    """Builds a rewards matrix from a text grid, one row of symbols per line."""
+    rows = [line.strip() for line in text.splitlines() if line.strip()]
+    if not rows:
+        raise ValueError("Grid is empty")
+    if any(len(row) != len(rows[0]) for row in rows):
+        raise ValueError("Grid rows must all have the same length")
+
+    rewards = np.empty((len(rows), len(rows[0])))
+    for row_index, row in enumerate(rows):
+        for col_index, symbol in enumerate(row):
+            if symbol not in GRID_SYMBOLS:
+                raise ValueError(f"Unknown grid symbol '{symbol}' at row {row_index}, column {col_index}")
+            rewards[row_index, col_index] = GRID_SYMBOLS[symbol].value
+    return rewards
+
+
+def load_grid(path):
+    """Loads a grid from a .npy file, a map file or a text grid file.
+
+    Returns the grid and the reward table to solve it with, which is
+    CELL_REWARDS unless a map file was written with another table. A
+    uint8 .npy file holds CellType values and is returned as is, and so
+    are the memory-mapped (N, H, W) cells of a map file.
+    """
+    if str(path).endswith(MAP_EXTENSION):
+        maps = load_maps(path)
+        if maps.discount != DISCOUNT_FACTOR:
+            raise ValueError(f"{path} was written with discount factor {maps.discount}, "
+                             f"the solver uses {DISCOUNT_FACTOR}")
+        return (maps.cells, maps.reward_table)
+
+    if str(path).endswith('.npy'):
+        grid = np.load(path)
+        return (grid if is_cell_grid(grid) else grid.astype(np.float64), CELL_REWARDS)
+
+    with open(path) as grid_file:
+        return (parse_grid(grid_file.read()), CELL_REWARDS)
+
+
+def extract_policy(utilities, rewards):
+    """Picks the best direction for every cell, the same way the mouse moves.
+
+    Each cell moves to the neighbor with the highest utility, checked in the
+    order up, down, left, right and only taken when strictly better than the
+    best so far, which starts at the cell itself. Rocks and moves off the
+    grid are never taken. Runs as whole-array operations, and also takes
+    stacks of grids with leading batch axes.
+    """
+    rows, cols = utilities.shape[-2:]
+    _, rock = cell_masks(rewards)
+    pad_width = [(0, 0)]*(utilities.ndim - 2) + [(1, 1), (1, 1)]
+    padded = np.pad(utilities, pad_width)
+    blocked = np.pad(rock, pad_width, constant_values=True)
+
+    max_cell_value = utilities.copy()
+    policy = np.full(utilities.shape, Direction.CURRENT.value, dtype=np.int8)
+    for direction in (Direction.UP, Direction.DOWN, Direction.LEFT, Direction.RIGHT):
+        row_shift, col_shift = DIRECTION_SHIFTS[direction]
+        row_slice = slice(1 + row_shift, rows + 1 + row_shift)
+        col_slice = slice(1 + col_shift, cols + 1 + col_shift)
+        neighbor_value = padded[..., row_slice, col_slice]
+        better = ~blocked[..., row_slice, col_slice] & (neighbor_value > max_cell_value)
+        max_cell_value[better] = neighbor_value[better]
+        policy[better] = direction.value
+
+    policy[rock] = Direction.CURRENT.value
+    return policy
@@ -0,0 +1,96 @@
+"""Warm-started re-solves that only revisit cells affected by grid edits."""
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, MAX_ERROR
+from solver.grid import CELL_REWARDS, grid_rewards
+from solver.neighbors import build_neighbor_table
+from solver.progress import PROGRESS_INTERVAL, ProgressClock
+
+
+def adjacent_cells(cells, shape):
+    """Returns the flat cells together with their in-grid 4-neighbors."""
+    rows, cols = shape
+    row_index, col_index = np.divmod(cells, cols)
+    candidates = (
+        (cells, np.ones(cells.size, dtype=bool)),
+        (cells - cols, row_index > 0),
+        (cells + cols, row_index < rows - 1),
+        (cells - 1, col_index > 0),
+        (cells + 1, col_index < cols - 1),
+    )
+    return np.unique(np.concatenate([neighbor[in_grid] for neighbor, in_grid in candidates]))
+
+
+def frontier_update(maze, flat_rewards, neighbors, cells):
+    """Bellman update of the free cells given with their neighbor table rows, in place.
+
+    Returns the absolute change of every updated cell.
+    """
+    up_val = maze[neighbors[:, 0]]
+    left_val = maze[neighbors[:, 1]]
+    down_val = maze[neighbors[:, 2]]
+    right_val = maze[neighbors[:, 3]]
+
+    best_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
+    np.maximum(best_val, 0.8*left_val + 0.1*up_val + 0.1*down_val, out=best_val)
+    np.maximum(best_val, 0.8*down_val + 0.1*left_val + 0.1*right_val, out=best_val)
+    np.maximum(best_val, 0.8*right_val + 0.1*up_val + 0.1*down_val, out=best_val)
+
+    final_util = flat_rewards[cells] + DISCOUNT_FACTOR*best_val
+    util_change = np.abs(final_util - maze[cells])
+    maze[cells] = final_util
+    return util_change
+
+
+def incremental_value_iteration(rewards, utilities, dirty_cells, progress=None,
+                                progress_interval=PROGRESS_INTERVAL, reward_table=CELL_REWARDS):
+    """Re-solves a maze warm-started from the utilities of a previous solve.
+
+    rewards is a rewards matrix or a CellType grid, whose rewards are looked
+    up in reward_table. dirty_cells holds the (row, column) of every cell whose reward changed
+    since utilities were computed. Only a frontier of free cells is swept:
+    it starts at the dirty cells and their neighbors, and each sweep keeps
+    the neighbors of every cell that still changed by max_error or more.
+    A cell changing by just under max_error every sweep drops its neighbors
+    while it keeps drifting, so once the frontier is empty a full sweep of
+    every free cell checks the result, and the cells it still changes by
+    max_error or more seed a new frontier. The solve stops after a full
+    sweep that changes no cell by max_error or more, the same stopping
+    criterion as a cold solve.
+    """
+    free_cells, neighbors = build_neighbor_table(rewards)
+    flat_rewards = np.asarray(grid_rewards(rewards, reward_table), dtype=np.float64).ravel()
+    maze = np.array(utilities, dtype=np.float64).ravel()
+    free_slot = np.full(flat_rewards.size, -1, dtype=np.intp)
+    free_slot[free_cells] = np.arange(free_cells.size)
+    max_error = MAX_ERROR
+    count = 0
+    report_progress = ProgressClock(progress, progress_interval)
+
+    dirty_cells = np.asarray(dirty_cells, dtype=np.intp).reshape(-1, 2)
+    dirty = np.ravel_multi_index((dirty_cells[:, 0], dirty_cells[:, 1]), rewards.shape)
+
+    # Cells that are not free hold their reward, there is nothing to iterate
+    fixed = dirty[free_slot[dirty] < 0]
+    maze[fixed] = flat_rewards[fixed]
+
+    frontier = adjacent_cells(dirty, rewards.shape)
+    frontier = frontier[free_slot[frontier] >= 0]
+
+    while True:
+        if frontier.size:
+            util_change = frontier_update(maze, flat_rewards, neighbors[free_slot[frontier]], frontier)
+            changed = frontier[util_change >= max_error]
+        else:
+            # Verification sweep over every free cell
+            util_change = frontier_update(maze, flat_rewards, neighbors, free_cells)
+            changed = free_cells[util_change >= max_error]
+            if not changed.size:
+                count+= 1
+                break
+
+        count+= 1
+        frontier = adjacent_cells(changed, rewards.shape)
+        frontier = frontier[free_slot[frontier] >= 0]
+        report_progress(count, util_change.max(initial=0.0))
+
+    return (maze.reshape(rewards.shape), count)
@@ -0,0 +1,187 @@
+"""Versioned binary map files of cell types with optional solved results."""
+import json
+import struct
+import numpy as np
+from solver.constants import CELL_REWARDS, DISCOUNT_FACTOR
+
+MAP_MAGIC = b'MOUSEMAP'
+MAP_VERSION = 1
+MAP_EXTENSION = '.mousemap'
+# Magic bytes, format version, metadata length and map count. A JSON metadata block
+# follows with the grid shape, reward table, discount factor and stored result fields
+MAP_PREFIX = struct.Struct('<8sIIQ')
+# Records start at a multiple of this many bytes from the start of the file
+MAP_ALIGNMENT = 64
+
+
+def map_record_dtype(shape, utilities_dtype=None, policy=False):
+    """Returns the aligned record dtype of a map with the result fields that are stored.
+
+    Utilities are stored together with the sweep count that produced them.
+    """
+    fields = []
+    if utilities_dtype is not None:
+        fields += [('utilities', np.dtype(utilities_dtype).newbyteorder('<'), shape), ('count', '<i8')]
+    fields.append(('cells', np.uint8, shape))
+    if policy:
+        fields.append(('policy', np.int8, shape))
+    return np.dtype(fields, align=True)
+
+
+class MapWriter:
+    """Appends maps of one shape to a new map file.
+
+    utilities_dtype and policy choose the result fields every map stores.
+    Records are appended as they come and only the map count in the prefix
+    is rewritten, by flush and close, so a batch run can stream results for
+    millions of maps without holding them in memory. Readers only see the
+    maps counted, so a file whose writer stopped halfway through still
+    loads. The writer can be used as a context manager that closes it.
+    """
+    def __init__(self, path, shape, reward_table=CELL_REWARDS, discount=DISCOUNT_FACTOR,
+                 utilities_dtype=None, policy=False):
+        self.path = path
+        self.shape = tuple(int(side) for side in shape)
+        self.reward_table = np.asarray(reward_table, dtype=np.float64)
+        self.record_dtype = map_record_dtype(self.shape, utilities_dtype, policy)
+        self.count = 0
+
+        metadata = json.dumps({
+            'shape': self.shape,
+            'reward_table': self.reward_table.tolist(),
+            'discount': discount,
+            'utilities_dtype': None if utilities_dtype is None else np.dtype(utilities_dtype).newbyteorder('<').str,
+            'policy': policy,
+        }).encode()
+        # Pad the metadata with spaces so the records start aligned
+        records_offset = -(-(MAP_PREFIX.size + len(metadata))//MAP_ALIGNMENT)*MAP_ALIGNMENT
+        self.metadata_size = records_offset - MAP_PREFIX.size
+        self.map_file = open(path, 'wb')
+        self.map_file.write(MAP_PREFIX.pack(MAP_MAGIC, MAP_VERSION, self.metadata_size, 0))
+        self.map_file.write(metadata.ljust(self.metadata_size))
+        # Readers can open the file, with no maps, before the first flush
+        self.map_file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, cells, utilities=None, policy=None, count=0):
+        """Appends one map and its results."""
+        self.extend(np.asarray(cells)[np.newaxis], None if utilities is None else np.asarray(utilities)[np.newaxis],
+                    None if policy is None else np.asarray(policy)[np.newaxis], None if utilities is None else [count])
+
+    def extend(self, cells, utilities=None, policy=None, counts=None):
+        """Appends an (N, H, W) stack of CellType grids and their results.
+
+        Takes the result fields the writer stores and no others, counts
+        being the (N,) sweep counts of the utilities.
+        """
+        cells = np.asarray(cells)
+        if cells.shape[1:] != self.shape:
+            raise ValueError(f"Map file holds {self.shape} grids, got {cells.shape[1:]}")
+        fields = {'cells': cells, 'utilities': utilities, 'count': counts, 'policy': policy}
+        for name, values in fields.items():
+            if (values is not None) != (name in self.record_dtype.names):
+                raise ValueError(f"Map file {'does not store' if values is not None else 'stores'} {name}")
+
+        records = np.zeros(cells.shape[0], dtype=self.record_dtype)
+        for name, values in fields.items():
+            if values is not None:
+                records[name] = values
+        self.map_file.write(records.tobytes())
+        self.count += records.size
+
+    def flush(self):
+        """Writes the map count, so readers see every map appended so far."""
+        self.map_file.flush()
+        self.map_file.seek(0)
+        self.map_file.write(MAP_PREFIX.pack(MAP_MAGIC, MAP_VERSION, self.metadata_size, self.count))
+        self.map_file.seek(0, 2)
+        self.map_file.flush()
+
+    def close(self):
+        """Writes the map count and closes the file."""
+        if not self.map_file.closed:
+            self.flush()
+            self.map_file.close()
+
+
+class MapFile:
+    """The maps of a map file, memory-mapped read-only.
+
+    Maps are stored as aligned fixed-size records, so the record array is
+    mapped as is. cells, utilities, counts and policy are (N, H, W) and (N,)
+    views into the file rather than copies, and the result fields that are
+    not stored are None.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as map_file:
+            prefix = map_file.read(MAP_PREFIX.size)
+            if len(prefix) < MAP_PREFIX.size or prefix[:len(MAP_MAGIC)] != MAP_MAGIC:
+                raise ValueError(f"{path} is not a map file")
+            _, self.version, metadata_size, self.count = MAP_PREFIX.unpack(prefix)
+            if self.version > MAP_VERSION:
+                raise ValueError(f"{path} has map file version {self.version}, newer than {MAP_VERSION}")
+            metadata = json.loads(map_file.read(metadata_size))
+
+        self.path = path
+        self.shape = tuple(metadata['shape'])
+        self.reward_table = np.array(metadata['reward_table'])
+        self.discount = metadata['discount']
+        record_dtype = map_record_dtype(self.shape, metadata['utilities_dtype'], metadata['policy'])
+        if self.count:
+            self.records = np.memmap(path, dtype=record_dtype, mode='r', offset=MAP_PREFIX.size + metadata_size,
+                                     shape=(self.count,))
+        else:
+            # Empty files cannot be mapped
+            self.records = np.zeros(0, dtype=record_dtype)
+
+    def __len__(self):
+        return self.count
+
+    def __repr__(self):
+        stored = [name for name in ('utilities', 'policy') if name in self.records.dtype.names]
+        return f"MapFile({self.path!r}, maps={self.count}, shape={self.shape}, stored={stored})"
+
+    def field(self, name):
+        """Returns the view of a record field, or None if it is not stored."""
+        return self.records[name] if name in self.records.dtype.names else None
+
+    @property
+    def cells(self):
+        """(N, H, W) CellType grids."""
+        return self.records['cells']
+
+    @property
+    def utilities(self):
+        """(N, H, W) stored utilities, or None."""
+        return self.field('utilities')
+
+    @property
+    def counts(self):
+        """(N,) sweep counts of the stored utilities, or None."""
+        return self.field('count')
+
+    @property
+    def policy(self):
+        """(N, H, W) stored policies, one Direction value per cell, or None."""
+        return self.field('policy')
+
+
+def load_maps(path):
+    """Opens a map file, memory-mapping its maps."""
+    return MapFile(path)
+
+
+def save_map(path, cells, reward_table=CELL_REWARDS, discount=DISCOUNT_FACTOR, utilities=None, policy=None,
+             count=0):
+    """Writes a map file holding a single CellType grid and its optional results."""
+    utilities_dtype = None if utilities is None else np.asarray(utilities).dtype
+    with MapWriter(path, np.shape(cells), reward_table, discount, utilities_dtype, policy is not None) as writer:
+        writer.append(cells, utilities, policy, count)
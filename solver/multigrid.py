@@ -0,0 +1,96 @@
+"""Coarse-to-fine warm starts for large grids."""
+import time
+import numpy as np
+from solver.constants import CellRewards, CellType
+from solver.grid import CELL_REWARDS, cell_masks, grid_rewards, is_cell_grid
+from solver.reachability import sealed_cells
+
+# Grids are not halved below this many cells on their shorter side
+MIN_COARSE_SIDE = 32
+
+
+def coarsen_grid(grid, reward_table=CELL_REWARDS):
+    """Halves a rewards matrix or CellType grid, each cell standing for a 2x2 block.
+
+    A block takes its best cell: the cheese, so it survives coarsening,
+    then a free cell, then a fire, and only a block of four rocks becomes a
+    rock. Fires lose to free cells since a 2x2 block with one fire is still
+    mostly open; letting them win turns scattered fires into walls of fire
+    on the coarse grids. Grids with an odd side are padded with rocks.
+    """
+    rows, cols = grid.shape
+    free, rock = cell_masks(grid)
+    rewards = grid_rewards(grid, reward_table)
+    _, reward_rank = np.unique(rewards, return_inverse=True)
+    # Higher rewards win between cells of the same kind
+    kind = np.select([rock, free, rewards > 0], [0, 2, 3], 1)
+    rank = kind*grid.size + reward_rank.reshape(grid.shape)
+
+    pad_width = ((0, rows % 2), (0, cols % 2))
+    rock_value = CellType.ROCK if is_cell_grid(grid) else CellRewards.ROCK.value
+    padded_grid = np.pad(grid, pad_width, constant_values=rock_value)
+    padded_rank = np.pad(rank, pad_width, constant_values=-1)
+
+    coarse_rows, coarse_cols = padded_grid.shape[0]//2, padded_grid.shape[1]//2
+    blocks = padded_rank.reshape(coarse_rows, 2, coarse_cols, 2).transpose(0, 2, 1, 3)
+    best = blocks.reshape(coarse_rows, coarse_cols, 4).argmax(axis=2)
+    row_index = 2*np.arange(coarse_rows)[:, np.newaxis] + best//2
+    col_index = 2*np.arange(coarse_cols)[np.newaxis, :] + best % 2
+    return padded_grid[row_index, col_index]
+
+
+def prolong_utilities(utilities, shape):
+    """Spreads coarse utilities over the 2x2 blocks they stand for, cropped to shape."""
+    return np.repeat(np.repeat(utilities, 2, axis=0), 2, axis=1)[:shape[0], :shape[1]]
+
+
+def grid_levels(grid, reward_table=CELL_REWARDS, min_side=MIN_COARSE_SIDE):
+    """Returns the grid and its coarser levels, finest first."""
+    levels = [grid]
+    while min(levels[-1].shape) >= 2*min_side:
+        levels.append(coarsen_grid(levels[-1], reward_table))
+    return levels
+
+
+def multigrid_value_iteration(rewards, solve_level, reward_table=CELL_REWARDS, min_side=MIN_COARSE_SIDE,
+                              stats=None, **options):
+    """Solves a grid with solve_level, warm started from its coarser levels.
+
+    The grid is halved repeatedly and the coarsest level is solved from
+    scratch. Each solution is spread back over the 2x2 blocks of the next
+    finer level as the starting utilities of its solve, down to the full
+    grid. The full grid is still solved to the usual tolerance, so the warm
+    start only changes how many sweeps that takes, not the accuracy of the
+    result, and it only pays off for Gauss-Seidel sweeps: Jacobi sweeps
+    barely converge faster from a warm start. Unless a prune option turns
+    pruning off, the sealed cells become rocks before coarsening, so they
+    cannot merge with reachable cells into coarse cells that carry the wrong
+    utility across a wall.
+
+    solve_level is a backend function that takes initial_utilities, and
+    options are passed on to it at every level. Returns the utilities and
+    sweep count of the full grid. The time spent on the coarser levels is
+    counted as setup time in stats, and their sweep counts, coarsest first,
+    are stored in stats.level_counts.
+    """
+    start_time = time.perf_counter()
+    coarse_source = rewards
+    if options.get('prune', True):
+        rock_value = CellType.ROCK if is_cell_grid(rewards) else CellRewards.ROCK.value
+        coarse_source = np.where(sealed_cells(rewards, reward_table), rock_value, rewards).astype(rewards.dtype)
+    levels = grid_levels(coarse_source, reward_table, min_side)
+    utilities = None
+    level_counts = []
+    for level in reversed(levels[1:]):
+        initial_utilities = None if utilities is None else prolong_utilities(utilities, level.shape)
+        utilities, count = solve_level(level, reward_table=reward_table, initial_utilities=initial_utilities, **options)
+        level_counts.append(count)
+    coarse_time = time.perf_counter() - start_time
+
+    initial_utilities = None if utilities is None else prolong_utilities(utilities, rewards.shape)
+    utilities, count = solve_level(rewards, reward_table=reward_table, initial_utilities=initial_utilities,
+                                   stats=stats, **options)
+    if stats is not None:
+        stats.setup_time += coarse_time
+        stats.level_counts = level_counts
+    return (utilities, count)
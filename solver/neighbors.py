@@ -0,0 +1,63 @@
+"""Neighbor tables that resolve walls and rocks once per solve."""
+import numpy as np
+from solver.grid import cell_masks
+
+
+# Row and column offsets of the neighbor table columns: up, left, down, right
+NEIGHBOR_SHIFTS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+# Columns of the cell a move goes to and the two cells it slips sideways to, for
+# moving up, left, down and right
+MOVE_COLUMNS = np.array([[0, 1, 3], [1, 0, 2], [2, 1, 3], [3, 0, 2]])
+
+
+def build_neighbor_table(rewards):
+    """Builds flat neighbor indices for every free cell of a rewards matrix.
+
+    Returns the flat indices of the free cells and an (n, 4) table holding,
+    for each of them, the flat index of the cell reached by moving up, left,
+    down and right. A move into a rock or off the grid keeps the mouse in
+    place, so those entries point back at the cell itself and the kernels
+    never have to check bounds or compare rewards while sweeping.
+
+    A stack of grids with leading batch axes is also accepted, the indices
+    are then flat indices into the whole stack and moves never cross from
+    one grid into the next. rewards can also be a CellType grid.
+    """
+    rows, cols = rewards.shape[-2:]
+    index_dtype = np.int32 if rewards.size <= np.iinfo(np.int32).max else np.int64
+    cell_index = np.arange(rewards.size, dtype=index_dtype).reshape(rewards.shape)
+    pad_width = [(0, 0)]*(rewards.ndim - 2) + [(1, 1), (1, 1)]
+    padded_index = np.pad(cell_index, pad_width)
+    free, rock = cell_masks(rewards)
+    blocked = np.pad(rock, pad_width, constant_values=True)
+
+    free_cells = np.flatnonzero(free).astype(index_dtype)
+    neighbors = np.empty((free_cells.size, len(NEIGHBOR_SHIFTS)), dtype=index_dtype)
+    for column, (row_shift, col_shift) in enumerate(NEIGHBOR_SHIFTS):
+        row_slice = slice(1 + row_shift, rows + 1 + row_shift)
+        col_slice = slice(1 + col_shift, cols + 1 + col_shift)
+        neighbor_index = np.where(blocked[..., row_slice, col_slice], cell_index,
+                                  padded_index[..., row_slice, col_slice])
+        neighbors[:, column] = neighbor_index.ravel()[free_cells]
+    return free_cells, neighbors
+
+
+def red_black_order(free_cells, neighbors, cols):
+    """Reorders a neighbor table so the red cells of a checkerboard come first.
+
+    A cell is red when the sum of its row and column is even. Every neighbor
+    of a red cell is black or the cell itself, so all cells of one color can
+    be updated in place at once. Returns the reordered free cells and table
+    and the number of red cells.
+    """
+    black = (free_cells//cols + free_cells % cols) % 2 == 1
+    order = np.argsort(black, kind='stable')
+    return (free_cells[order], neighbors[order], int(np.count_nonzero(~black)))
+
+
+def policy_table(neighbors, moves):
+    """Returns the (n, 3) flat indices of where the move of each free cell goes and slips to.
+
+    moves holds a neighbor table column, 0 to 3, for each row of neighbors.
+    """
+    return np.take_along_axis(neighbors, MOVE_COLUMNS[moves], axis=1)
@@ -0,0 +1,490 @@
+"""Numba-compiled value iteration kernels, cached on disk after their first compilation."""
+import time
+import numpy as np
+from numba import get_num_threads, jit, prange
+from solver.constants import DISCOUNT_FACTOR, EVALUATION_SWEEPS, MAX_ERROR, CellRewards, CellType
+from solver.grid import CELL_REWARDS, grid_rewards, is_cell_grid, start_utilities
+from solver.neighbors import MOVE_COLUMNS, red_black_order
+from solver.prebuilt import USE_AOT, aot_kernel
+from solver.progress import PROGRESS_INTERVAL, ProgressClock
+from solver.reachability import pruned_neighbor_table
+from solver.stats import RESIDUAL_CHUNK
+
+
+# Free cells per parallel work item, each item reduces its residual to a scalar
+BLOCK_SIZE = 1024
+
+
+def kernel_inputs(rewards, reward_table):
+    """Returns the grid and reward table arguments of the kernels.
+
+    The kernels take either a rewards matrix, with None for the reward
+    table, or a uint8 grid of CellType values and the table its rewards are
+    looked up in. A cell type is one byte per cell instead of eight, which
+    cuts the memory read per sweep on large maps. Read-only grids, such as the memory-mapped cells of a map file, are
+    copied, since Numba compiles separate kernels for read-only arrays.
+    """
+    if is_cell_grid(rewards) and not USE_AOT:
+        return (np.require(rewards, requirements=('C', 'W')), np.require(reward_table, np.float64, ('C', 'W')))
+    # The ahead-of-time kernels are only built for rewards matrices
+    return (np.require(grid_rewards(rewards, reward_table), np.float64, ('C', 'W')), None)
+
+
+def parallel_value_iteration(rewards, progress=None, progress_interval=PROGRESS_INTERVAL,
+                             reward_table=CELL_REWARDS, dtype=np.float64, prune=True, mode='jacobi',
+                             evaluation_sweeps=EVALUATION_SWEEPS, initial_utilities=None, stats=None):
+    """Parallel updating of maze cell values in parallel.
+
+    Without a progress callback the kernel runs to convergence in one call,
+    otherwise it is called for as many sweeps as take about
+    progress_interval seconds, reporting the progress between calls. dtype
+    sets the float type the utilities are stored in, the ahead-of-time
+    kernels always use float64. A SolveStats given as stats gets the
+    residual of every sweep, which the kernel writes into a buffer of one
+    call's worth of sweeps. With prune set, sealed cells hold their final
+    utility from the start and are left out of the free cell table. mode
+    picks the kernel and initial_utilities warm starts the free cells, as
+    in seq_value_iteration. With MOUSE_SOLVER_AOT=1 the ahead-of-time build
+    from `python -m solver.aot` runs instead, which never compiles at run
+    time but sweeps on a single thread.
+    """
+    start_time = time.perf_counter()
+    free_cells, neighbors, fixed_utilities = pruned_neighbor_table(rewards, reward_table, prune, compiled=True)
+    if mode == 'gauss_seidel':
+        free_cells, neighbors, red_count = red_black_order(free_cells, neighbors, rewards.shape[-1])
+    grid, grid_reward_table = kernel_inputs(rewards, reward_table)
+    sweeps = MODE_KERNELS[mode]
+    if USE_AOT:
+        sweeps = aot_kernel(sweeps.py_func.__name__, neighbors.dtype)
+        dtype = np.float64
+    report_progress = ProgressClock(progress, progress_interval)
+    if progress:
+        sweep_limit = 1
+    elif stats is not None:
+        sweep_limit = RESIDUAL_CHUNK
+    else:
+        sweep_limit = np.iinfo(np.int64).max
+    residuals = np.zeros(RESIDUAL_CHUNK if stats is not None else 0)
+    if mode == 'jacobi' and initial_utilities is None:
+        maze = np.zeros(grid.size, dtype=dtype)
+        temp = fixed_utilities.ravel().astype(dtype)
+    else:
+        maze = start_utilities(fixed_utilities, free_cells, mode, dtype, initial_utilities)
+        temp = maze.copy()
+    moves = np.zeros(free_cells.size, dtype=np.int8)
+    count = 0
+    if stats is not None:
+        stats.setup_time = time.perf_counter() - start_time
+        stats.threads = 1 if USE_AOT else get_num_threads()
+
+    while True:
+        start_time = time.perf_counter()
+        first_count = count
+        if mode == 'gauss_seidel':
+            count, max_util_change = sweeps(grid, grid_reward_table, free_cells, neighbors, red_count,
+                                            maze, count, sweep_limit, residuals)
+        elif mode == 'policy_iteration':
+            maze, temp, count, max_util_change = sweeps(grid, grid_reward_table, free_cells, neighbors,
+                                                        maze, temp, moves, evaluation_sweeps, count,
+                                                        sweep_limit, residuals)
+        else:
+            maze, temp, count, max_util_change = sweeps(grid, grid_reward_table, free_cells, neighbors,
+                                                        maze, temp, count, sweep_limit, residuals)
+        sweep_time = time.perf_counter() - start_time
+        if stats is not None:
+            stats.sweep_time += sweep_time
+            stats.residuals.extend(residuals[:count - first_count].tolist())
+        if max_util_change < MAX_ERROR:
+            break
+        if progress:
+            report_progress(count, max_util_change)
+            sweep_limit = report_progress.chunk_sweeps(count - first_count, sweep_time, RESIDUAL_CHUNK)
+
+    start_time = time.perf_counter()
+    utilities = maze.reshape(grid.shape)
+    if stats is not None:
+        stats.copy_time = time.perf_counter() - start_time
+        stats.count = count
+    return (utilities, count)
+
+
+@jit(nopython=True, cache=True)
+def cell_reward(flat_grid, reward_table, cell):
+    """Reward of a cell, looked up in reward_table when the grid holds cell types."""
+    if reward_table is None:
+        return flat_grid[cell]
+    return reward_table[flat_grid[cell]]
+
+
+@jit(nopython=True, cache=True)
+def cell_utility(maze, reward, neighbors, free_index):
+    """Bellman update of one free cell from its row of the neighbor table."""
+    return cell_move_utility(maze, reward, neighbors, free_index)[0]
+
+
+@jit(nopython=True, cache=True)
+def cell_move_utility(maze, reward, neighbors, free_index):
+    """Bellman update of one free cell, and the table column of its greedy move."""
+    up_val = maze[neighbors[free_index, 0]]
+    left_val = maze[neighbors[free_index, 1]]
+    down_val = maze[neighbors[free_index, 2]]
+    right_val = maze[neighbors[free_index, 3]]
+
+    best_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
+    best_move = 0
+    dir_val = 0.8*left_val + 0.1*up_val + 0.1*down_val
+    if dir_val > best_val:
+        best_val = dir_val
+        best_move = 1
+    dir_val = 0.8*down_val + 0.1*left_val + 0.1*right_val
+    if dir_val > best_val:
+        best_val = dir_val
+        best_move = 2
+    dir_val = 0.8*right_val + 0.1*up_val + 0.1*down_val
+    if dir_val > best_val:
+        best_val = dir_val
+        best_move = 3
+
+    return (reward + DISCOUNT_FACTOR*best_val, best_move)
+
+
+@jit(nopython=True, cache=True)
+def cell_policy_utility(maze, reward, neighbors, free_index, move):
+    """Update of one free cell under a fixed move, a column of MOVE_COLUMNS."""
+    move_val = maze[neighbors[free_index, MOVE_COLUMNS[move, 0]]]
+    slip_val = maze[neighbors[free_index, MOVE_COLUMNS[move, 1]]]
+    other_slip_val = maze[neighbors[free_index, MOVE_COLUMNS[move, 2]]]
+    return reward + DISCOUNT_FACTOR*(0.8*move_val + 0.1*slip_val + 0.1*other_slip_val)
+
+
+@jit(parallel=True, nopython=True, cache=True)
+def parallel_sweeps(rewards, reward_table, free_cells, neighbors, maze, temp, count, sweep_limit,
+                    residuals):
+    """Sweeps the free cells of a maze in parallel until convergence.
+
+    maze and temp are the flat utility buffers and count the sweeps done so
+    far; a fresh solve starts from zeros, the rewards and 0. Returns after
+    convergence or sweep_limit sweeps with the buffers (maze holding the
+    latest utilities), the new count and the last largest change. Unless
+    residuals is empty, the largest change of the i-th sweep of this call
+    is written to residuals[i].
+
+    Neighbor lookups come from the precomputed table, so the update has no
+    bounds checks or reward comparisons. The sweep loop does not allocate:
+    the two utility grids are swapped by reference after every sweep, the
+    four directional mixes are reduced with scalar comparisons, and each
+    block of cells writes its largest change into a buffer allocated once
+    before the loop.
+    """
+    flat_rewards = rewards.ravel()
+    free_count = free_cells.size
+    block_count = (free_count + BLOCK_SIZE - 1)//BLOCK_SIZE
+    block_util_change = np.zeros(block_count)
+    max_error = MAX_ERROR
+    first_sweep = count
+    last_sweep = count + sweep_limit
+
+    while True:
+        for block_index in prange(block_count):
+            block_max_change = 0.0
+            for free_index in range(block_index*BLOCK_SIZE, min(free_count, (block_index + 1)*BLOCK_SIZE)):
+                cell = free_cells[free_index]
+                final_util = cell_utility(maze, cell_reward(flat_rewards, reward_table, cell),
+                                          neighbors, free_index)
+                temp[cell] = final_util
+                if abs(final_util - maze[cell]) > block_max_change:
+                    block_max_change = abs(final_util - maze[cell])
+            block_util_change[block_index] = block_max_change
+
+        # A serial reduction, array.max() would allocate per-thread partials
+        max_util_change = 0.0
+        for block_index in range(block_count):
+            if block_util_change[block_index] > max_util_change:
+                max_util_change = block_util_change[block_index]
+        if residuals.size:
+            residuals[count - first_sweep] = max_util_change
+
+        count+= 1
+        maze, temp = temp, maze
+        if count == 1:
+            # Non-free cells only hold their rewards in the buffer written first
+            temp[:] = maze
+        if max_util_change < max_error or count == last_sweep:
+            break
+
+    return (maze, temp, count, max_util_change)
+
+
+@jit(parallel=True, nopython=True, cache=True)
+def red_black_sweeps(rewards, reward_table, free_cells, neighbors, red_count, maze, count, sweep_limit,
+                     residuals):
+    """Sweeps the free cells of a maze in place, one checkerboard color at a time, in parallel.
+
+    The first red_count rows of the free cell table are the red cells and
+    the rest the black ones, as ordered by red_black_order. A red cell only
+    reads black cells and itself, so the red cells are updated in parallel
+    from the latest black utilities and then the black cells from the new
+    red ones, which is a Gauss-Seidel sweep without races. Returns the new
+    count and the last largest change, and otherwise behaves like
+    parallel_sweeps.
+    """
+    flat_rewards = rewards.ravel()
+    free_count = free_cells.size
+    block_util_change = np.zeros((max(red_count, free_count - red_count) + BLOCK_SIZE - 1)//BLOCK_SIZE)
+    max_error = MAX_ERROR
+    first_sweep = count
+    last_sweep = count + sweep_limit
+
+    while True:
+        block_util_change[:] = 0.0
+        for color in range(2):
+            first_free = 0 if color == 0 else red_count
+            last_free = red_count if color == 0 else free_count
+            for block_index in prange((last_free - first_free + BLOCK_SIZE - 1)//BLOCK_SIZE):
+                block_max_change = block_util_change[block_index]
+                block_start = first_free + block_index*BLOCK_SIZE
+                for free_index in range(block_start, min(last_free, block_start + BLOCK_SIZE)):
+                    cell = free_cells[free_index]
+                    final_util = cell_utility(maze, cell_reward(flat_rewards, reward_table, cell),
+                                              neighbors, free_index)
+                    if abs(final_util - maze[cell]) > block_max_change:
+                        block_max_change = abs(final_util - maze[cell])
+                    maze[cell] = final_util
+                block_util_change[block_index] = block_max_change
+
+        max_util_change = 0.0
+        for block_index in range(block_util_change.size):
+            if block_util_change[block_index] > max_util_change:
+                max_util_change = block_util_change[block_index]
+        if residuals.size:
+            residuals[count - first_sweep] = max_util_change
+
+        count+= 1
+        if max_util_change < max_error or count == last_sweep:
+            break
+
+    return (count, max_util_change)
+
+
+@jit(parallel=True, nopython=True, cache=True)
+def policy_iteration_sweeps(rewards, reward_table, free_cells, neighbors, maze, temp, moves,
+                            evaluation_sweeps, count, sweep_limit, residuals):
+    """Modified policy iteration sweeps of the free cells in parallel.
+
+    Sweeps 0, evaluation_sweeps + 1, 2*(evaluation_sweeps + 1), ... are
+    Bellman sweeps, which also store the greedy move of every free cell in
+    moves. The sweeps in between evaluate that policy, with one directional
+    mix per cell instead of four. Only a Bellman sweep can end the solve,
+    so the change returned is the one of the last Bellman sweep, or
+    infinity if this call ran none. Otherwise behaves like parallel_sweeps.
+    """
+    flat_rewards = rewards.ravel()
+    free_count = free_cells.size
+    block_count = (free_count + BLOCK_SIZE - 1)//BLOCK_SIZE
+    block_util_change = np.zeros(block_count)
+    max_error = MAX_ERROR
+    first_sweep = count
+    last_sweep = count + sweep_limit
+    bellman_change = np.inf
+
+    while True:
+        is_bellman = count % (evaluation_sweeps + 1) == 0
+        for block_index in prange(block_count):
+            block_max_change = 0.0
+            for free_index in range(block_index*BLOCK_SIZE, min(free_count, (block_index + 1)*BLOCK_SIZE)):
+                cell = free_cells[free_index]
+                reward = cell_reward(flat_rewards, reward_table, cell)
+                if is_bellman:
+                    final_util, moves[free_index] = cell_move_utility(maze, reward, neighbors, free_index)
+                else:
+                    final_util = cell_policy_utility(maze, reward, neighbors, free_index, moves[free_index])
+                temp[cell] = final_util
+                if abs(final_util - maze[cell]) > block_max_change:
+                    block_max_change = abs(final_util - maze[cell])
+            block_util_change[block_index] = block_max_change
+
+        max_util_change = 0.0
+        for block_index in range(block_count):
+            if block_util_change[block_index] > max_util_change:
+                max_util_change = block_util_change[block_index]
+        if residuals.size:
+            residuals[count - first_sweep] = max_util_change
+
+        count+= 1
+        maze, temp = temp, maze
+        if is_bellman:
+            bellman_change = max_util_change
+            if max_util_change < max_error:
+                break
+        if count == last_sweep:
+            break
+
+    return (maze, temp, count, bellman_change)
+
+
+@jit(parallel=True, nopython=True, cache=True)
+def sparse_sweeps(rewards, indptr, indices, probs, maze, temp, count, sweep_limit, residuals):
+    """Sweeps the free states of a SparseMaze in parallel until convergence.
+
+    rewards holds the rewards of the free states, which come first in the
+    maze and temp state arrays, and the terminal states after them keep
+    their utilities. Each action sums its transition list, so an action
+    whose slips land on the same state reads it once. Otherwise behaves
+    like parallel_sweeps.
+    """
+    free_count = rewards.size
+    block_count = (free_count + BLOCK_SIZE - 1)//BLOCK_SIZE
+    block_util_change = np.zeros(block_count)
+    max_error = MAX_ERROR
+    first_sweep = count
+    last_sweep = count + sweep_limit
+
+    while True:
+        for block_index in prange(block_count):
+            block_max_change = 0.0
+            for state in range(block_index*BLOCK_SIZE, min(free_count, (block_index + 1)*BLOCK_SIZE)):
+                best_val = -np.inf
+                for action_row in range(4*state, 4*state + 4):
+                    action_val = 0.0
+                    for entry in range(indptr[action_row], indptr[action_row + 1]):
+                        action_val+= probs[entry]*maze[indices[entry]]
+                    if action_val > best_val:
+                        best_val = action_val
+                final_util = rewards[state] + DISCOUNT_FACTOR*best_val
+                temp[state] = final_util
+                if abs(final_util - maze[state]) > block_max_change:
+                    block_max_change = abs(final_util - maze[state])
+            block_util_change[block_index] = block_max_change
+
+        max_util_change = 0.0
+        for block_index in range(block_count):
+            if block_util_change[block_index] > max_util_change:
+                max_util_change = block_util_change[block_index]
+        if residuals.size:
+            residuals[count - first_sweep] = max_util_change
+
+        count+= 1
+        maze, temp = temp, maze
+        if count == 1:
+            # Terminal states only hold their rewards in the buffer written first
+            temp[free_count:] = maze[free_count:]
+        if max_util_change < max_error or count == last_sweep:
+            break
+
+    return (maze, temp, count, max_util_change)
+
+
+MODE_KERNELS = {
+    'jacobi': parallel_sweeps,
+    'gauss_seidel': red_black_sweeps,
+    'policy_iteration': policy_iteration_sweeps,
+}
+
+
+def batch_value_iteration(rewards, reward_table=CELL_REWARDS, prune=True):
+    """Solves a stack of grids in one compiled call, in parallel over the stack.
+
+    Takes an (N, H, W) rewards array, or CellType grids, and returns the
+    (N, H, W) utilities and the (N,) iteration counts. Each grid converges
+    independently, which suits many small grids better than parallelizing
+    the rows of each one.
+    """
+    free_cells, neighbors, fixed_utilities = pruned_neighbor_table(rewards, reward_table, prune, compiled=True)
+    grid_size = rewards.shape[1]*rewards.shape[2]
+    grid_bounds = np.searchsorted(free_cells, np.arange(rewards.shape[0] + 1)*grid_size).astype(np.int64)
+    grid, grid_reward_table = kernel_inputs(rewards, reward_table)
+    sweeps = aot_kernel('batch_sweeps', neighbors.dtype) if USE_AOT else batch_sweeps
+    return sweeps(grid, grid_reward_table, free_cells, neighbors, grid_bounds, fixed_utilities)
+
+
+@jit(parallel=True, nopython=True, cache=True)
+def batch_sweeps(rewards, reward_table, free_cells, neighbors, grid_bounds, fixed_utilities):
+    """Sweeps every grid of a stack until it converges, one grid per thread.
+
+    grid_bounds[n]:grid_bounds[n + 1] is the range of the free cell table
+    that belongs to grid n. fixed_utilities holds the utilities of the
+    cells that are not swept.
+    """
+    grid_count = rewards.shape[0]
+    grid_size = rewards.shape[1]*rewards.shape[2]
+    flat_rewards = rewards.ravel()
+    utilities = np.zeros(flat_rewards.size)
+    scratch = fixed_utilities.ravel().copy()
+    counts = np.zeros(grid_count, dtype=np.int64)
+
+    for grid_index in prange(grid_count):
+        counts[grid_index] = grid_sweeps(flat_rewards, reward_table, free_cells, neighbors,
+                                         grid_bounds[grid_index], grid_bounds[grid_index + 1],
+                                         grid_index*grid_size, (grid_index + 1)*grid_size,
+                                         utilities, scratch)
+
+    return (utilities.reshape(rewards.shape), counts)
+
+
+@jit(nopython=True, cache=True)
+def grid_sweeps(flat_rewards, reward_table, free_cells, neighbors, first_free, last_free,
+                first_cell, last_cell, maze, temp):
+    """Sweeps one grid of a stack until convergence, leaving the result in maze.
+
+    Only the cells between first_cell and last_cell of the two buffers are
+    touched, so grids of the same stack can be swept concurrently.
+    """
+    result = maze
+    max_error = MAX_ERROR
+    count = 0
+
+    while True:
+        max_util_change = 0.0
+        for free_index in range(first_free, last_free):
+            cell = free_cells[free_index]
+            final_util = cell_utility(maze, cell_reward(flat_rewards, reward_table, cell),
+                                      neighbors, free_index)
+            temp[cell] = final_util
+            if abs(final_util - maze[cell]) > max_util_change:
+                max_util_change = abs(final_util - maze[cell])
+
+        count+= 1
+        maze, temp = temp, maze
+        if count == 1:
+            # Non-free cells only hold their rewards in the buffer written first
+            temp[first_cell:last_cell] = maze[first_cell:last_cell]
+        if max_util_change < max_error:
+            break
+
+    if count % 2 == 1:
+        result[first_cell:last_cell] = maze[first_cell:last_cell]
+    return count
+
+
+def parallel_diagnostics(kernel=parallel_sweeps, level=4):
+    """Prints Numba's parallel diagnostics of a parallel kernel.
+
+    Kernels loaded from the on-disk cache carry no diagnostics, so a fresh,
+    uncached copy of the kernel is compiled for every signature the kernel
+    has run with and reported on instead. Returns False, printing nothing,
+    when the kernel has not been compiled, such as under MOUSE_SOLVER_AOT.
+    """
+    if not kernel.signatures:
+        return False
+    fresh_kernel = jit(parallel=True, nopython=True)(kernel.py_func)
+    for signature in kernel.signatures:
+        fresh_kernel.compile(signature)
+    fresh_kernel.parallel_diagnostics(level=level)
+    return True
+
+
+def warm_up():
+    """Compiles the grid kernels, or loads them from the cache, and returns the seconds taken.
+
+    The sparse kernel is left to the sparse module's own warm_up.
+    """
+    start_time = time.perf_counter()
+    rewards = np.full((2, 2), CellRewards.EMPTY.value)
+    rewards[1, 1] = CellRewards.REWARD.value
+    cells = np.full((2, 2), CellType.EMPTY, dtype=np.uint8)
+    cells[1, 1] = CellType.REWARD
+    parallel_value_iteration(rewards)
+    parallel_value_iteration(cells)
+    batch_value_iteration(rewards[np.newaxis])
+    batch_value_iteration(cells[np.newaxis])
+    return time.perf_counter() - start_time
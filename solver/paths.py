@@ -0,0 +1,95 @@
+"""Following the policy of a solved grid from one or many start cells."""
+import numpy as np
+from solver.constants import Direction, PathEnd
+from solver.grid import DIRECTION_SHIFTS, cell_masks, grid_rewards
+
+
+def policy_moves(policy, rewards):
+    """Returns the flat index of the cell each cell of a policy moves to.
+
+    Terminal cells, the cheese and the fires, end a path, so they move to
+    themselves like cells whose best direction is to stay.
+    """
+    rows, cols = policy.shape
+    step = np.zeros(max(direction.value for direction in Direction) + 1, dtype=np.intp)
+    for direction, (row_shift, col_shift) in DIRECTION_SHIFTS.items():
+        step[direction.value] = row_shift*cols + col_shift
+
+    free, rock = cell_masks(rewards)
+    moves = np.arange(policy.size) + step[policy.ravel()]
+    moves[(~free & ~rock).ravel()] = np.flatnonzero(~free & ~rock)
+    return moves
+
+
+def path_ends(rewards, end_cells, is_moving):
+    """Classifies where paths stopped, as PathEnd values."""
+    free, rock = cell_masks(rewards)
+    terminal = (~free & ~rock).ravel()[end_cells]
+    is_reward = grid_rewards(rewards).ravel()[end_cells] > 0
+
+    ends = np.full(end_cells.size, PathEnd.DEAD_END.value, dtype=np.int8)
+    ends[terminal & is_reward] = PathEnd.REWARD.value
+    ends[terminal & ~is_reward] = PathEnd.FIRE.value
+    ends[is_moving] = PathEnd.LOOP.value
+    return ends
+
+
+def trace_paths(policy, rewards, starts, max_steps=None):
+    """Follows a policy from many start cells at once.
+
+    starts is an (n, 2) array of (row, column) start cells. Every path steps
+    together as one array operation, and paths that have stopped drop out.
+    A path stops on the cheese or a fire, or on a cell whose best direction
+    is to stay, which is a dead end. Since every cell has a single move, a
+    path still moving after max_steps (by default the number of cells) must
+    be going round a loop.
+
+    Returns the (n,) path lengths in moves, the (n, 2) end cells and the (n,)
+    PathEnd values.
+    """
+    if max_steps is None:
+        max_steps = policy.size
+    moves = policy_moves(policy, rewards)
+    starts = np.asarray(starts, dtype=np.intp).reshape(-1, 2)
+    cells = np.ravel_multi_index((starts[:, 0], starts[:, 1]), policy.shape)
+    lengths = np.zeros(cells.size, dtype=np.int64)
+    moving = np.arange(cells.size)
+
+    for _ in range(max_steps):
+        next_cells = moves[cells[moving]]
+        moved = next_cells != cells[moving]
+        moving = moving[moved]
+        if not moving.size:
+            break
+        cells[moving] = next_cells[moved]
+        lengths[moving] += 1
+    else:
+        moving = moving[moves[cells[moving]] != cells[moving]]
+
+    is_moving = np.zeros(cells.size, dtype=bool)
+    is_moving[moving] = True
+    ends = path_ends(rewards, cells, is_moving)
+    return (lengths, np.column_stack(np.unravel_index(cells, policy.shape)), ends)
+
+
+def trace_path(policy, rewards, start):
+    """Follows a policy from one start cell and returns every cell on the way.
+
+    Returns the list of (row, column) cells, start included, and the
+    PathEnd value. A loop ends the path before its first repeated cell.
+    """
+    moves = policy_moves(policy, rewards)
+    cell = int(np.ravel_multi_index(start, policy.shape))
+    path = [cell]
+    visited = {cell}
+
+    while True:
+        next_cell = int(moves[cell])
+        if next_cell == cell or next_cell in visited:
+            break
+        cell = next_cell
+        path.append(cell)
+        visited.add(cell)
+
+    end = path_ends(rewards, np.array([cell]), np.array([next_cell != cell]))[0]
+    return ([divmod(path_cell, policy.shape[1]) for path_cell in path], PathEnd(end))
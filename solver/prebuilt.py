@@ -0,0 +1,24 @@
+"""Numba, when installed, and the kernels compiled ahead of time by solver.aot."""
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    # Numba is optional: without it the parallel backend is missing and the
+    # other backends sweep, and flood fill, with NumPy operations
+    numba = None
+
+try:
+    from solver import _aot_kernels
+except ImportError:
+    _aot_kernels = None
+
+USE_AOT = os.environ.get('MOUSE_SOLVER_AOT') == '1' and _aot_kernels is not None
+
+
+def aot_kernel(name, index_dtype=None):
+    """Returns an ahead-of-time compiled kernel, the variant for a neighbor table dtype if given."""
+    if index_dtype is None:
+        return getattr(_aot_kernels, name)
+    return getattr(_aot_kernels, f"{name}_{np.dtype(index_dtype).name}")
@@ -0,0 +1,42 @@
+"""Progress reporting and cancellation of long solves."""
+import time
+
+
+# Seconds between two progress reports, unless a single sweep takes longer
+PROGRESS_INTERVAL = 0.1
+
+
+class SolveCancelled(Exception):
+    """Raised from a progress callback to stop a solve."""
+
+
+class ProgressClock:
+    """Paces the progress reports of a solve by wall time.
+
+    Solvers that accept a progress callback call it as progress(count,
+    max_util_change) after the first sweep that ends progress_interval
+    seconds or more after the last report. The callback may raise
+    SolveCancelled to stop the solve, which then propagates to the caller,
+    so a cancelled solve stops within one interval or one sweep.
+    """
+    def __init__(self, progress, progress_interval=PROGRESS_INTERVAL):
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.last_report = time.perf_counter()
+
+    def __call__(self, count, max_util_change):
+        """Reports the progress if the interval has passed since the last report."""
+        if not self.progress:
+            return
+        now = time.perf_counter()
+        if now - self.last_report >= self.progress_interval:
+            self.last_report = now
+            self.progress(count, max_util_change)
+
+    def chunk_sweeps(self, sweeps, seconds, max_sweeps):
+        """Sweeps the next call of a compiled kernel should run to last about one interval.
+
+        sweeps and seconds are how many sweeps the last call ran and how
+        long it took. The result is between 1 and max_sweeps.
+        """
+        return int(min(max(sweeps*self.progress_interval/max(seconds, 1e-9), 1), max_sweeps))
@@ -0,0 +1,127 @@
+"""Reachability pruning of free cells that no terminal cell can influence."""
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, CellType
+from solver.grid import CELL_REWARDS, cell_masks, grid_rewards, is_cell_grid
+from solver.neighbors import build_neighbor_table
+from solver.prebuilt import USE_AOT, aot_kernel, numba
+
+
+def sealed_utilities(rewards):
+    """Utilities that sealed cells converge to, given their rewards.
+
+    A free cell walled off by rocks from every cheese and fire only ever
+    sees free neighbors that are walled off too, so its utility converges
+    to its own reward discounted forever, as long as every cell of its
+    region has the same reward. The solvers give sealed cells this value up
+    front and only sweep the cells a flood fill from the terminals reaches.
+    """
+    return rewards/(1 - DISCOUNT_FACTOR)
+
+
+def numpy_flood_fill(passable, reached, rows, cols):
+    """Marks every passable cell 4-connected to a reached cell, in place.
+
+    passable and reached are flat views of one or more stacked rows x cols
+    grids. Grows a frontier one cell at a time in every direction, so it
+    takes one step per cell of the longest path from a terminal.
+    """
+    frontier = np.flatnonzero(reached)
+    while frontier.size:
+        row_index = frontier//cols % rows
+        col_index = frontier % cols
+        candidates = np.concatenate((
+            frontier[row_index > 0] - cols,
+            frontier[row_index < rows - 1] + cols,
+            frontier[col_index > 0] - 1,
+            frontier[col_index < cols - 1] + 1,
+        ))
+        candidates = np.unique(candidates[passable[candidates] & ~reached[candidates]])
+        reached[candidates] = True
+        frontier = candidates
+
+
+if numba is not None:
+    @numba.jit(nopython=True, cache=True)
+    def compiled_flood_fill(passable, reached, rows, cols):
+        """Marks every passable cell 4-connected to a reached cell, in place.
+
+        A depth-first fill with an explicit stack, which visits every cell at
+        most once however winding the paths are.
+        """
+        stack = np.empty(passable.size, dtype=np.int64)
+        top = 0
+        for cell in range(passable.size):
+            if reached[cell]:
+                stack[top] = cell
+                top+= 1
+
+        while top:
+            top-= 1
+            cell = stack[top]
+            row_index = cell//cols % rows
+            col_index = cell % cols
+            for neighbor, in_grid in ((cell - cols, row_index > 0), (cell + cols, row_index < rows - 1),
+                                      (cell - 1, col_index > 0), (cell + 1, col_index < cols - 1)):
+                if in_grid and passable[neighbor] and not reached[neighbor]:
+                    reached[neighbor] = True
+                    stack[top] = neighbor
+                    top+= 1
+else:
+    compiled_flood_fill = None
+
+
+def sealed_cells(grid, reward_table=CELL_REWARDS, compiled=False):
+    """Returns the mask of the free cells that no terminal cell can reach.
+
+    Terminal cells are the cells that are neither free nor rocks. grid is a
+    rewards matrix or a CellType grid, and may have leading batch axes, in
+    which case no path crosses from one grid into the next. When
+    reward_table gives mouse and empty cells different rewards, the regions
+    holding a mouse are not sealed either, so every sealed region shares
+    one reward.
+
+    The compiled flood fill is used with compiled set, as the backends with
+    compiled kernels do, or once it has been compiled. The NumPy backends
+    otherwise fill with NumPy operations, so they never wait for a compile.
+    """
+    rows, cols = grid.shape[-2:]
+    free, rock = cell_masks(grid)
+    reached = ~free & ~rock
+    if is_cell_grid(grid) and reward_table[CellType.MOUSE] != reward_table[CellType.EMPTY]:
+        reached |= grid == CellType.MOUSE
+    reached = reached.ravel()
+    if USE_AOT:
+        flood_fill = aot_kernel('compiled_flood_fill')
+    elif compiled_flood_fill is not None and (compiled or compiled_flood_fill.signatures):
+        flood_fill = compiled_flood_fill
+    else:
+        flood_fill = numpy_flood_fill
+    flood_fill(free.ravel(), reached, rows, cols)
+    return free & ~reached.reshape(grid.shape)
+
+
+def prune_neighbor_table(free_cells, neighbors, sealed):
+    """Drops the sealed cells from the free cells and their neighbor table rows."""
+    kept = ~sealed.ravel()[free_cells]
+    return (free_cells[kept], neighbors[kept])
+
+
+def seal_rewards(rewards, sealed):
+    """Returns the rewards with the sealed cells holding their sealed utilities instead."""
+    return np.where(sealed, sealed_utilities(rewards), rewards)
+
+
+def pruned_neighbor_table(rewards, reward_table, prune, compiled=False):
+    """Builds the neighbor table of a grid, without the sealed cells if prune is set.
+
+    Returns the free cells to sweep, their neighbor table, and the float64
+    utilities the cells that are not swept keep: their rewards, or their
+    sealed utilities for sealed cells. compiled is passed on to sealed_cells.
+    """
+    free_cells, neighbors = build_neighbor_table(rewards)
+    fixed_utilities = grid_rewards(rewards, reward_table)
+    if prune:
+        sealed = sealed_cells(rewards, reward_table, compiled)
+        free_cells, neighbors = prune_neighbor_table(free_cells, neighbors, sealed)
+        fixed_utilities = seal_rewards(fixed_utilities, sealed)
+    return (free_cells, neighbors, np.ascontiguousarray(fixed_utilities, dtype=np.float64))
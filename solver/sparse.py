@@ -0,0 +1,258 @@
+"""Value iteration over a compact state array with CSR transition lists."""
+import time
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, MAX_ERROR, CellType
+from solver.grid import CELL_REWARDS, GRID_CELL_TYPES, cell_masks, grid_rewards
+from solver.neighbors import MOVE_COLUMNS, NEIGHBOR_SHIFTS
+from solver.prebuilt import USE_AOT, aot_kernel, numba
+from solver.progress import PROGRESS_INTERVAL, ProgressClock
+from solver.reachability import seal_rewards, sealed_cells
+from solver.stats import RESIDUAL_CHUNK
+
+if numba is not None:
+    from solver.parallel import sparse_sweeps
+else:
+    sparse_sweeps = None
+
+
+# Probabilities of moving the intended way and slipping to either side of it
+MOVE_PROBABILITIES = (0.8, 0.1, 0.1)
+# Floorplan symbol of a cell outside the map
+OUTSIDE_SYMBOL = ' '
+
+
+class SparseMaze:
+    """The cells of a map as a compact state array with CSR transition lists.
+
+    The other backends keep a utility for every cell of the grid's bounding
+    box, rocks included. Here only cells that are not rocks get a state, so
+    memory and sweep time follow the number of open cells rather than the
+    area, and irregular floorplans need no padding into a rectangle.
+    States are numbered free cells first, then terminal cells, which keep
+    their rewards as utilities. Row 4*state + action of the transition
+    lists, for the free states and the actions up, left, down and right,
+    holds the states the action can end in and their probabilities, with
+    outcomes that land on the same state merged into one entry.
+    """
+    def __init__(self, coordinates, rewards, free):
+        """Builds the transition lists of the cells at coordinates.
+
+        coordinates is an (n, 2) array of (row, column) cells, which may be
+        any set of cells. rewards holds their rewards, and free marks the
+        free cells, the others being terminals. Rocks and cells that are not
+        listed have no state, a move into them keeps the mouse in place.
+        """
+        coordinates = np.asarray(coordinates, dtype=np.int64).reshape(-1, 2)
+        free = np.asarray(free, dtype=bool)
+        order = np.argsort(~free, kind='stable')
+        self.coordinates = coordinates[order]
+        self.free_count = int(np.count_nonzero(free))
+        rewards = np.asarray(rewards, dtype=np.float64)[order]
+        self.rewards = rewards[:self.free_count]
+        self.fixed_utilities = rewards[self.free_count:]
+
+        index_dtype = np.int32 if self.state_count <= np.iinfo(np.int32).max else np.int64
+        neighbors = self.neighbor_states().astype(index_dtype)
+        targets = neighbors[:, MOVE_COLUMNS].reshape(-1, 3)
+        probs = np.tile(MOVE_PROBABILITIES, (targets.shape[0], 1))
+
+        # Merge the outcomes of an action that land on the same state
+        keep = np.ones(targets.shape, dtype=bool)
+        for first, second in ((0, 1), (0, 2), (1, 2)):
+            same = keep[:, first] & keep[:, second] & (targets[:, first] == targets[:, second])
+            probs[same, first] += probs[same, second]
+            keep[same, second] = False
+
+        self.indptr = np.concatenate(([0], np.cumsum(keep.sum(axis=1)))).astype(np.int64)
+        self.indices = targets[keep]
+        self.probs = probs[keep]
+
+    def __repr__(self):
+        return (f"SparseMaze(states={self.state_count}, free={self.free_count}, "
+                f"transitions={self.indices.size})")
+
+    @property
+    def state_count(self):
+        """Number of states, free and terminal."""
+        return self.coordinates.shape[0]
+
+    @property
+    def nbytes(self):
+        """Bytes held by the state and transition arrays."""
+        return sum(array.nbytes for array in (self.coordinates, self.rewards, self.fixed_utilities,
+                                              self.indptr, self.indices, self.probs))
+
+    def neighbor_states(self):
+        """Returns the (free_count, 4) states reached by moving up, left, down and right.
+
+        Neighbors are found by binary search over the sorted cell
+        coordinates, so no array spans the bounding box of the map.
+        """
+        origin = self.coordinates.min(axis=0, initial=0) - 1
+        span = self.coordinates[:, 1].max(initial=0) - origin[1] + 2
+        keys = (self.coordinates[:, 0] - origin[0])*span + (self.coordinates[:, 1] - origin[1])
+        key_order = np.argsort(keys)
+        sorted_keys = keys[key_order]
+        if np.any(sorted_keys[1:] == sorted_keys[:-1]):
+            raise ValueError("Sparse maze cells must have distinct coordinates")
+
+        free_states = np.arange(self.free_count)
+        neighbors = np.empty((self.free_count, len(NEIGHBOR_SHIFTS)), dtype=np.int64)
+        for column, (row_shift, col_shift) in enumerate(NEIGHBOR_SHIFTS):
+            neighbor_keys = keys[:self.free_count] + row_shift*span + col_shift
+            position = np.minimum(np.searchsorted(sorted_keys, neighbor_keys), sorted_keys.size - 1)
+            found = sorted_keys[position] == neighbor_keys
+            neighbors[:, column] = np.where(found, key_order[position], free_states)
+        return neighbors
+
+    def to_grid(self, values, shape, fill=np.nan):
+        """Scatters one value per state into a grid of shape, fill elsewhere."""
+        grid = np.full(shape, fill, dtype=np.float64)
+        grid[self.coordinates[:, 0], self.coordinates[:, 1]] = values
+        return grid
+
+
+def sparse_maze_from_grid(grid, reward_table=CELL_REWARDS, prune=True):
+    """Builds the SparseMaze of a rewards matrix or CellType grid.
+
+    Rocks get no state. With prune set, neither do the free cells that no
+    terminal cell can reach, which never influence the other cells.
+    """
+    free, rock = cell_masks(grid)
+    present = ~rock
+    if prune:
+        present &= ~sealed_cells(grid, reward_table, compiled=sparse_sweeps is not None)
+    return SparseMaze(np.argwhere(present), grid_rewards(grid, reward_table)[present], free[present])
+
+
+def parse_floorplan(text, reward_table=CELL_REWARDS):
+    """Builds the SparseMaze of a text floorplan.
+
+    Uses the symbols of text grids, and a space for a cell outside the map.
+    Lines may have different lengths and start with spaces, so the map can
+    take any shape.
+    """
+    coordinates = []
+    cell_types = []
+    for row_index, line in enumerate(text.splitlines()):
+        for col_index, symbol in enumerate(line.rstrip()):
+            if symbol == OUTSIDE_SYMBOL:
+                continue
+            if symbol not in GRID_CELL_TYPES:
+                raise ValueError(f"Unknown floorplan symbol '{symbol}' at row {row_index}, column {col_index}")
+            coordinates.append((row_index, col_index))
+            cell_types.append(GRID_CELL_TYPES[symbol])
+    if not coordinates:
+        raise ValueError("Floorplan is empty")
+
+    cells = np.array(cell_types, dtype=np.uint8)
+    free, rock = cell_masks(cells)
+    return SparseMaze(np.array(coordinates)[~rock], reward_table[cells[~rock]], free[~rock])
+
+
+def numpy_sparse_sweeps(rewards, indptr, indices, probs, maze, temp, count, sweep_limit, residuals):
+    """Sweeps the free states of a sparse maze with NumPy operations, like sparse_sweeps."""
+    free_count = rewards.size
+    first_sweep = count
+    last_sweep = count + sweep_limit
+
+    while True:
+        action_vals = np.add.reduceat(probs*maze[indices], indptr[:-1]) if free_count else np.zeros(0)
+        temp[:free_count] = rewards + DISCOUNT_FACTOR*action_vals.reshape(-1, 4).max(axis=1, initial=-np.inf)
+        max_util_change = np.abs(temp[:free_count] - maze[:free_count]).max(initial=0.0)
+        if residuals.size:
+            residuals[count - first_sweep] = max_util_change
+
+        count+= 1
+        maze, temp = temp, maze
+        if count == 1:
+            # Terminal states only hold their rewards in the buffer written first
+            temp[free_count:] = maze[free_count:]
+        if max_util_change < MAX_ERROR or count == last_sweep:
+            break
+
+    return (maze, temp, count, max_util_change)
+
+
+def solve_sparse(maze, progress=None, progress_interval=PROGRESS_INTERVAL, stats=None):
+    """Runs value iteration on a SparseMaze and returns (state utilities, count).
+
+    Sweeps are Jacobi sweeps with the stopping criterion of the other
+    backends. The compiled kernel is used when Numba is installed, and it
+    is called in chunks for progress reports and residual histories the
+    same way as by parallel_value_iteration.
+    """
+    start_time = time.perf_counter()
+    if sparse_sweeps is None:
+        sweeps = numpy_sparse_sweeps
+    elif USE_AOT:
+        sweeps = aot_kernel('sparse_sweeps', maze.indices.dtype)
+    else:
+        sweeps = sparse_sweeps
+    report_progress = ProgressClock(progress, progress_interval)
+    if progress:
+        sweep_limit = 1
+    elif stats is not None:
+        sweep_limit = RESIDUAL_CHUNK
+    else:
+        sweep_limit = np.iinfo(np.int64).max
+    residuals = np.zeros(RESIDUAL_CHUNK if stats is not None else 0)
+    utilities = np.zeros(maze.state_count)
+    temp = np.concatenate((np.zeros(maze.free_count), maze.fixed_utilities))
+    count = 0
+    if stats is not None:
+        stats.setup_time += time.perf_counter() - start_time
+        stats.threads = 1 if sparse_sweeps is None or USE_AOT else numba.get_num_threads()
+
+    while True:
+        start_time = time.perf_counter()
+        first_count = count
+        utilities, temp, count, max_util_change = sweeps(maze.rewards, maze.indptr, maze.indices, maze.probs,
+                                                         utilities, temp, count, sweep_limit, residuals)
+        sweep_time = time.perf_counter() - start_time
+        if stats is not None:
+            stats.sweep_time += sweep_time
+            stats.residuals.extend(residuals[:count - first_count].tolist())
+        if max_util_change < MAX_ERROR:
+            break
+        if progress:
+            report_progress(count, max_util_change)
+            sweep_limit = report_progress.chunk_sweeps(count - first_count, sweep_time, RESIDUAL_CHUNK)
+
+    if stats is not None:
+        stats.count = count
+    return (utilities, count)
+
+
+def sparse_value_iteration(rewards, progress=None, progress_interval=PROGRESS_INTERVAL,
+                           reward_table=CELL_REWARDS, prune=True, stats=None):
+    """Updating of maze cell values over the sparse states of a grid.
+
+    Builds the SparseMaze of the grid, solves it and scatters the state
+    utilities back into a grid, where rocks, and sealed cells when pruning,
+    hold the same fixed utilities as with the other backends.
+    """
+    start_time = time.perf_counter()
+    maze = sparse_maze_from_grid(rewards, reward_table, prune)
+    if stats is not None:
+        stats.setup_time = time.perf_counter() - start_time
+    state_utilities, count = solve_sparse(maze, progress, progress_interval, stats)
+
+    start_time = time.perf_counter()
+    utilities = grid_rewards(rewards, reward_table).astype(np.float64)
+    if prune:
+        sealed = sealed_cells(rewards, reward_table, compiled=sparse_sweeps is not None)
+        utilities = seal_rewards(utilities, sealed)
+    utilities[maze.coordinates[:, 0], maze.coordinates[:, 1]] = state_utilities
+    if stats is not None:
+        stats.copy_time = time.perf_counter() - start_time
+    return (utilities, count)
+
+
+def warm_up():
+    """Compiles the sparse kernel, or loads it from the cache, and returns the seconds taken."""
+    start_time = time.perf_counter()
+    cells = np.full((2, 2), CellType.EMPTY, dtype=np.uint8)
+    cells[1, 1] = CellType.REWARD
+    sparse_value_iteration(cells)
+    return time.perf_counter() - start_time
@@ -0,0 +1,54 @@
+"""Convergence history and timings of a solve."""
+
+
+# Sweeps per kernel call while a residual history is recorded without progress reports
+RESIDUAL_CHUNK = 1024
+
+
+class SolveStats:
+    """Convergence history, per-phase timings and thread count of a solve.
+
+    Backends that accept a stats argument fill in the SolveStats they are
+    given as they run, and skip the bookkeeping entirely without one.
+    level_counts holds the sweeps of the coarser levels of a multigrid
+    solve, coarsest first, and stays empty otherwise.
+    """
+    def __init__(self, backend=None):
+        """Initialize empty stats."""
+        self.backend = backend
+        self.count = 0
+        self.residuals = []
+        self.setup_time = 0.0
+        self.sweep_time = 0.0
+        self.copy_time = 0.0
+        self.threads = 1
+        self.level_counts = []
+
+    def __repr__(self):
+        return (f"SolveStats(backend={self.backend!r}, count={self.count}, "
+                f"setup_time={self.setup_time:0.4f}, sweep_time={self.sweep_time:0.4f}, "
+                f"copy_time={self.copy_time:0.4f}, threads={self.threads})")
+
+    @property
+    def total_time(self):
+        """Seconds spent in setup, sweeps and copying the result."""
+        return self.setup_time + self.sweep_time + self.copy_time
+
+    @property
+    def final_residual(self):
+        """Largest utility change of the last sweep, or None before any sweep."""
+        return self.residuals[-1] if self.residuals else None
+
+    def as_dict(self):
+        """Returns the stats as plain values, ready for JSON."""
+        return {
+            'backend': self.backend,
+            'count': self.count,
+            'residuals': list(self.residuals),
+            'setup_time': self.setup_time,
+            'sweep_time': self.sweep_time,
+            'copy_time': self.copy_time,
+            'total_time': self.total_time,
+            'threads': self.threads,
+            'level_counts': list(self.level_counts),
+        }
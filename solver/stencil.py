@@ -0,0 +1,40 @@
+"""Whole-array Bellman updates shared by the NumPy backends."""
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR
+
+
+def stencil_update(padded, blocked, rewards, free):
+    """One Jacobi sweep of a block of cells as whole-array operations.
+
+    padded holds the current utilities of the block surrounded by a one-cell
+    halo, and blocked marks, with the same halo, every cell a move cannot
+    enter. Returns the updated utilities of the block and the largest change
+    of a free cell.
+    """
+    maze = padded[1:-1, 1:-1]
+    up_val = np.where(blocked[:-2, 1:-1], maze, padded[:-2, 1:-1])
+    down_val = np.where(blocked[2:, 1:-1], maze, padded[2:, 1:-1])
+    left_val = np.where(blocked[1:-1, :-2], maze, padded[1:-1, :-2])
+    right_val = np.where(blocked[1:-1, 2:], maze, padded[1:-1, 2:])
+
+    best_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
+    np.maximum(best_val, 0.8*left_val + 0.1*up_val + 0.1*down_val, out=best_val)
+    np.maximum(best_val, 0.8*down_val + 0.1*left_val + 0.1*right_val, out=best_val)
+    np.maximum(best_val, 0.8*right_val + 0.1*up_val + 0.1*down_val, out=best_val)
+
+    temp = np.where(free, rewards + DISCOUNT_FACTOR*best_val, rewards)
+    max_util_change = np.abs(temp - maze, where=free, out=np.zeros_like(temp)).max()
+    return (temp, max_util_change)
+
+
+def table_mixes(utilities, neighbors):
+    """The four directional mixes of every row of a neighbor table, as a (4, n) array.
+
+    utilities is flat, and the mixes are ordered up, left, down, right like
+    the table columns.
+    """
+    up_val, left_val, down_val, right_val = (utilities[neighbors[:, column]] for column in range(4))
+    return np.stack((0.8*up_val + 0.1*left_val + 0.1*right_val,
+                     0.8*left_val + 0.1*up_val + 0.1*down_val,
+                     0.8*down_val + 0.1*left_val + 0.1*right_val,
+                     0.8*right_val + 0.1*up_val + 0.1*down_val))
@@ -0,0 +1,231 @@
+"""Domain-decomposed solver that sweeps tiles of very large maps in worker processes."""
+import multiprocessing
+import os
+import time
+from multiprocessing import connection, shared_memory
+import numpy as np
+from solver.constants import MAX_ERROR, CellType
+from solver.grid import CELL_REWARDS, cell_masks, grid_rewards, is_cell_grid
+from solver.progress import PROGRESS_INTERVAL, ProgressClock
+from solver.reachability import sealed_cells, sealed_utilities
+from solver.stencil import stencil_update
+
+
+DEFAULT_TILE_SHAPE = (1024, 1024)
+# Sealed cells of a CellType grid are shared as their cell type plus this, which the
+# worker reward table maps to their sealed utility
+SEALED_OFFSET = len(CellType)
+# Slots of the shared status array: sweep count and largest change of the last sweep,
+# written by the first worker, a cancel request from the parent, and the request as
+# the first worker published it for the current sweep
+STATUS_COUNT, STATUS_CHANGE, STATUS_CANCEL, STATUS_CANCELLING = range(4)
+
+
+def split_tiles(shape, tile_shape):
+    """Returns the (row_start, row_end, col_start, col_end) of every tile of a map."""
+    rows, cols = shape
+    tile_rows, tile_cols = tile_shape
+    return [(row_start, min(row_start + tile_rows, rows), col_start, min(col_start + tile_cols, cols))
+            for row_start in range(0, rows, tile_rows)
+            for col_start in range(0, cols, tile_cols)]
+
+
+class Tile:
+    """A tile of the map together with the halo window it reads every sweep."""
+    def __init__(self, grid, reward_table, bounds):
+        """Precomputes the masks of the tile, grid is the whole shared map.
+
+        grid is a rewards matrix, with None for reward_table, or a CellType
+        grid whose rewards are looked up in reward_table every sweep, so
+        the tile never holds a float copy of its rewards.
+        """
+        rows, cols = grid.shape
+        row_start, row_end, col_start, col_end = bounds
+        self.cells = (slice(row_start, row_end), slice(col_start, col_end))
+        self.shape = (row_end - row_start + 2, col_end - col_start + 2)
+
+        # The halo is clipped at the map edges, where blocked keeps the mouse in place
+        halo_row_start, halo_row_end = max(row_start - 1, 0), min(row_end + 1, rows)
+        halo_col_start, halo_col_end = max(col_start - 1, 0), min(col_end + 1, cols)
+        self.halo = (slice(halo_row_start, halo_row_end), slice(halo_col_start, halo_col_end))
+        self.padded_halo = (slice(halo_row_start - row_start + 1, halo_row_end - row_start + 1),
+                            slice(halo_col_start - col_start + 1, halo_col_end - col_start + 1))
+
+        self.grid = grid[self.cells]
+        self.reward_table = reward_table
+        self.free, _ = cell_masks(self.grid)
+        self.blocked = np.ones(self.shape, dtype=bool)
+        self.blocked[self.padded_halo] = cell_masks(grid[self.halo])[1]
+
+    def sweep(self, maze, temp, scratch):
+        """Updates the tile from maze into temp and returns its largest change."""
+        padded = scratch[:self.shape[0], :self.shape[1]]
+        padded[self.padded_halo] = maze[self.halo]
+        temp[self.cells], max_util_change = stencil_update(padded, self.blocked,
+                                                           grid_rewards(self.grid, self.reward_table), self.free)
+        return max_util_change
+
+
+def tile_worker(worker_index, tile_bounds, shape, grid_dtype, reward_table, block_names, barrier,
+                residual_pipe):
+    """Sweeps a set of tiles in lockstep with the other workers until convergence.
+
+    The map and both utility buffers live in shared memory, so the halo of a
+    tile is read straight from the cells its neighbors wrote last sweep. After
+    every sweep each worker publishes its largest change, and all workers
+    take the same convergence decision from the published values. The first
+    worker also publishes the sweep count and largest change of the map
+    for progress reports, and every worker stops early at a cancel request
+    it publishes. When residual_pipe is given, the first worker sends the
+    largest change of every sweep through it at the end of a solve that
+    was not cancelled.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in block_names]
+    try:
+        grid = np.ndarray(shape, dtype=grid_dtype, buffer=blocks[0].buf)
+        buffers = (np.ndarray(shape, dtype=np.float64, buffer=blocks[1].buf),
+                   np.ndarray(shape, dtype=np.float64, buffer=blocks[2].buf))
+        residuals = np.ndarray((barrier.parties,), dtype=np.float64, buffer=blocks[3].buf)
+        status = np.ndarray((4,), dtype=np.float64, buffer=blocks[4].buf)
+
+        tiles = [Tile(grid, reward_table, bounds) for bounds in tile_bounds]
+        scratch = np.empty((max(tile.shape[0] for tile in tiles), max(tile.shape[1] for tile in tiles)))
+        history = []
+        max_error = MAX_ERROR
+        count = 0
+
+        while True:
+            maze, temp = buffers[count % 2], buffers[(count + 1) % 2]
+            residuals[worker_index] = max(tile.sweep(maze, temp, scratch) for tile in tiles)
+            if worker_index == 0:
+                status[STATUS_CANCELLING] = status[STATUS_CANCEL]
+            barrier.wait()
+            max_util_change = residuals.max()
+            converged = max_util_change < max_error
+            cancelled = status[STATUS_CANCELLING] != 0
+            count+= 1
+            if worker_index == 0:
+                status[STATUS_COUNT] = count
+                status[STATUS_CHANGE] = max_util_change
+                history.append(max_util_change)
+            # Nobody may publish the next residual before everyone has read this one
+            barrier.wait()
+            if converged or cancelled:
+                break
+
+        if residual_pipe is not None and not cancelled:
+            residual_pipe.send(history)
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        # The arrays must be released before their shared memory can be closed
+        grid = buffers = residuals = status = maze = temp = tiles = None
+        for block in blocks:
+            block.close()
+
+
+def tiled_value_iteration(rewards, progress=None, progress_interval=PROGRESS_INTERVAL, reward_table=CELL_REWARDS,
+                          tile_shape=DEFAULT_TILE_SHAPE, workers=None, prune=True, stats=None):
+    """Updating of maze cell values in tiles spread across worker processes.
+
+    The map is split into tiles of at most tile_shape cells, which are dealt
+    out to the workers (one per core by default). The map and the two
+    utility buffers are placed in shared memory once and never pickled. A
+    CellType grid is shared as is, one byte per cell, and its rewards are
+    looked up in reward_table by the tiles. Maps may be rectangular. Each
+    sweep is a Jacobi sweep, so the result and iteration count match
+    vectorized_value_iteration. Sealed cells get their final utility as a
+    fixed value, which the tiles never sweep. Progress is reported from the
+    sweep count the workers publish, and a SolveStats given as stats gets
+    the residual of every sweep.
+    """
+    start_time = time.perf_counter()
+    tiles = split_tiles(rewards.shape, tile_shape)
+    workers = min(workers or os.cpu_count() or 1, len(tiles))
+    if is_cell_grid(rewards):
+        grid_dtype = np.uint8
+        worker_reward_table = np.asarray(reward_table, dtype=np.float64)
+        worker_reward_table = np.concatenate((worker_reward_table, sealed_utilities(worker_reward_table)))
+    else:
+        grid_dtype = np.float64
+        worker_reward_table = None
+    cell_bytes = rewards.size*np.dtype(np.float64).itemsize
+    block_sizes = (rewards.size*np.dtype(grid_dtype).itemsize, cell_bytes, cell_bytes, workers*8, 4*8)
+    blocks = []
+    processes = []
+    residual_pipe, residual_sender = (None, None)
+
+    try:
+        for block_size in block_sizes:
+            blocks.append(shared_memory.SharedMemory(create=True, size=block_size))
+        grid = np.ndarray(rewards.shape, dtype=grid_dtype, buffer=blocks[0].buf)
+        grid[...] = rewards
+        if prune:
+            sealed = sealed_cells(rewards, reward_table)
+            if worker_reward_table is None:
+                grid[sealed] = sealed_utilities(grid[sealed])
+            else:
+                grid[sealed] += SEALED_OFFSET
+        np.ndarray(rewards.shape, dtype=np.float64, buffer=blocks[1].buf)[...] = 0
+        status = np.ndarray((4,), dtype=np.float64, buffer=blocks[4].buf)
+        status[...] = 0
+
+        context = multiprocessing.get_context()
+        if stats is not None:
+            residual_pipe, residual_sender = context.Pipe(duplex=False)
+        barrier = context.Barrier(workers)
+        block_names = [block.name for block in blocks]
+        processes = [context.Process(target=tile_worker,
+                                     args=(worker_index, tiles[worker_index::workers], rewards.shape, grid_dtype,
+                                           worker_reward_table, block_names, barrier,
+                                           residual_sender if worker_index == 0 else None))
+                     for worker_index in range(workers)]
+        for process in processes:
+            process.start()
+        if stats is not None:
+            stats.setup_time = time.perf_counter() - start_time
+            stats.threads = workers
+        start_time = time.perf_counter()
+
+        report_progress = ProgressClock(progress, progress_interval)
+        history = None
+        reported_count = 0
+        sentinels = [process.sentinel for process in processes]
+        while any(process.is_alive() for process in processes):
+            if residual_pipe is not None and history is None and residual_pipe.poll():
+                history = residual_pipe.recv()
+            waiting = sentinels + ([residual_pipe] if residual_pipe is not None and history is None else [])
+            connection.wait(waiting, progress_interval if progress else None)
+            if status[STATUS_COUNT] > reported_count:
+                try:
+                    report_progress(int(status[STATUS_COUNT]), float(status[STATUS_CHANGE]))
+                except BaseException:
+                    status[STATUS_CANCEL] = 1
+                    raise
+                reported_count = status[STATUS_COUNT]
+        if any(process.exitcode != 0 for process in processes):
+            raise RuntimeError("A tiled value iteration worker failed")
+        if residual_pipe is not None and history is None:
+            history = residual_pipe.recv()
+
+        count = int(status[STATUS_COUNT])
+        if stats is not None:
+            stats.sweep_time = time.perf_counter() - start_time
+            stats.residuals.extend(history)
+            stats.count = count
+        start_time = time.perf_counter()
+        maze = np.ndarray(rewards.shape, dtype=np.float64, buffer=blocks[1 + count % 2].buf).copy()
+        if stats is not None:
+            stats.copy_time = time.perf_counter() - start_time
+        return (maze, count)
+    finally:
+        for process in processes:
+            process.join()
+        for pipe in (residual_pipe, residual_sender):
+            if pipe is not None:
+                pipe.close()
+        grid = status = None
+        for block in blocks:
+            block.close()
+            block.unlink()
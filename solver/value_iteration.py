@@ -0,0 +1,380 @@
+"""Value iteration kernels for the mouse grid."""
+import time
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, EVALUATION_SWEEPS, MAX_ERROR, SOLVE_MODES
+from solver.dispatch import choose_backend, use_threads
+from solver.grid import CELL_REWARDS, cell_masks, cell_rewards, grid_rewards, is_cell_grid, start_utilities
+from solver.multigrid import multigrid_value_iteration
+from solver.neighbors import policy_table, red_black_order
+from solver.progress import PROGRESS_INTERVAL, ProgressClock
+from solver.reachability import pruned_neighbor_table, seal_rewards, sealed_cells
+from solver.stats import SolveStats
+from solver.prebuilt import numba
+from solver.sparse import sparse_value_iteration, warm_up as sparse_warm_up
+from solver.stencil import stencil_update, table_mixes
+from solver.tiled import tiled_value_iteration
+
+if numba is not None:
+    from solver.parallel import parallel_value_iteration, batch_value_iteration, warm_up as parallel_warm_up
+else:
+    parallel_value_iteration = None
+    batch_value_iteration = None
+
+
+def seq_value_iteration(rewards, progress=None, progress_interval=PROGRESS_INTERVAL,
+                        reward_table=CELL_REWARDS, prune=True, mode='jacobi',
+                        evaluation_sweeps=EVALUATION_SWEEPS, initial_utilities=None, stats=None):
+    """Sequential updating of maze cell values sequentially.
+
+    mode picks the sweep order, one of SOLVE_MODES. Gauss-Seidel sweeps
+    update the utilities in place, the red cells of a checkerboard before
+    the black ones. Policy iteration follows every Bellman sweep with
+    evaluation_sweeps cheaper sweeps of its greedy policy. Every mode stops
+    after a Bellman sweep that changes no utility by MAX_ERROR or more.
+    initial_utilities, a grid of the shape of rewards, warm starts the free
+    cells.
+    """
+    start_time = time.perf_counter()
+    free_cells, neighbors, fixed_utilities = pruned_neighbor_table(rewards, reward_table, prune)
+    if mode == 'gauss_seidel':
+        free_cells, neighbors, _ = red_black_order(free_cells, neighbors, rewards.shape[-1])
+    cell_neighbors = list(zip(free_cells.tolist(), neighbors.tolist()))
+    flat_rewards = fixed_utilities.ravel().tolist()
+    if mode == 'jacobi' and initial_utilities is None:
+        maze = [0.0]*len(flat_rewards)
+        temp = list(flat_rewards)
+    else:
+        maze = start_utilities(fixed_utilities, free_cells, mode, initial_utilities=initial_utilities).tolist()
+        temp = maze if mode == 'gauss_seidel' else list(maze)
+    cell_moves = None
+    evaluations_left = 0
+    max_error = MAX_ERROR
+    count = 0
+    report_progress = ProgressClock(progress, progress_interval)
+    if stats is not None:
+        stats.setup_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+
+    while True:
+        is_bellman = not evaluations_left
+        if is_bellman:
+            max_util_change, cell_moves = seq_bellman_sweep(cell_neighbors, flat_rewards, maze, temp,
+                                                            mode == 'policy_iteration')
+            if mode == 'policy_iteration':
+                evaluations_left = evaluation_sweeps
+        else:
+            max_util_change = seq_evaluation_sweep(cell_moves, flat_rewards, maze, temp)
+            evaluations_left-= 1
+        count+= 1
+        maze, temp = temp, maze
+        if count == 1 and mode == 'jacobi':
+            # Non-free cells only hold their rewards in the buffer written first
+            temp[:] = maze
+        if stats is not None:
+            stats.residuals.append(max_util_change)
+        if is_bellman and max_util_change < max_error:
+            break
+        report_progress(count, max_util_change)
+
+    return finish_stats(stats, start_time, lambda: np.array(maze).reshape(rewards.shape), count)
+
+
+def seq_bellman_sweep(cell_neighbors, flat_rewards, maze, temp, record_moves=False):
+    """Bellman update of every free cell from maze into temp, and returns the largest change.
+
+    temp may be maze itself, which updates the cells in place. With
+    record_moves, also returns a (cell, goes to, slips to, slips to) tuple
+    of flat indices for the greedy move of each cell, otherwise None.
+    """
+    max_util_change = 0
+    cell_moves = [] if record_moves else None
+    for cell, (up_cell, left_cell, down_cell, right_cell) in cell_neighbors:
+        up_val = maze[up_cell]
+        left_val = maze[left_cell]
+        down_val = maze[down_cell]
+        right_val = maze[right_cell]
+        dir_up_val = 0.8*up_val + 0.1*left_val + 0.1*right_val
+        dir_left_val = 0.8*left_val + 0.1*up_val + 0.1*down_val
+        dir_down_val = 0.8*down_val + 0.1*left_val + 0.1*right_val
+        dir_right_val = 0.8*right_val + 0.1*up_val + 0.1*down_val
+        best_val = max(dir_up_val, dir_left_val, dir_down_val, dir_right_val)
+        final_util = flat_rewards[cell] + DISCOUNT_FACTOR*best_val
+        if abs(final_util - maze[cell]) > max_util_change:
+            max_util_change = abs(final_util - maze[cell])
+        temp[cell] = final_util
+        if record_moves:
+            if dir_up_val == best_val:
+                cell_moves.append((cell, up_cell, left_cell, right_cell))
+            elif dir_left_val == best_val:
+                cell_moves.append((cell, left_cell, up_cell, down_cell))
+            elif dir_down_val == best_val:
+                cell_moves.append((cell, down_cell, left_cell, right_cell))
+            else:
+                cell_moves.append((cell, right_cell, up_cell, down_cell))
+    return (max_util_change, cell_moves)
+
+
+def seq_evaluation_sweep(cell_moves, flat_rewards, maze, temp):
+    """Update of every free cell under a fixed policy from maze into temp, and returns the largest change."""
+    max_util_change = 0
+    for cell, move_cell, slip_cell, other_slip_cell in cell_moves:
+        final_util = flat_rewards[cell] + DISCOUNT_FACTOR*(0.8*maze[move_cell] + 0.1*maze[slip_cell] +
+                                                           0.1*maze[other_slip_cell])
+        if abs(final_util - maze[cell]) > max_util_change:
+            max_util_change = abs(final_util - maze[cell])
+        temp[cell] = final_util
+    return max_util_change
+
+
+def vectorized_value_iteration(rewards, progress=None, progress_interval=PROGRESS_INTERVAL,
+                               reward_table=CELL_REWARDS, dtype=np.float64, prune=True, mode='jacobi',
+                               evaluation_sweeps=EVALUATION_SWEEPS, initial_utilities=None, stats=None):
+    """Updating of maze cell values with whole-array NumPy operations.
+
+    Every sweep is computed from shifted views of a padded copy of the maze,
+    so there is no per-cell Python code. The directional mixes are summed in
+    the same order as seq_value_iteration, which makes the utilities agree
+    with it to within 1e-12 (in practice they are bit-identical) and the
+    iteration count match. dtype sets the float type the utilities are
+    stored and swept in. The other solve modes are swept by
+    table_value_iteration.
+    """
+    if mode != 'jacobi':
+        return table_value_iteration(rewards, progress, progress_interval, reward_table, dtype, prune, mode,
+                                     evaluation_sweeps, initial_utilities, stats)
+
+    start_time = time.perf_counter()
+    rows, cols = rewards.shape
+    free, rock = cell_masks(rewards)
+    fixed_utilities = grid_rewards(rewards, reward_table)
+    if prune:
+        sealed = sealed_cells(rewards, reward_table)
+        free &= ~sealed
+        fixed_utilities = seal_rewards(fixed_utilities, sealed)
+    rewards = fixed_utilities.astype(dtype, copy=False)
+
+    # A neighbor that is a rock or lies outside the grid leaves the mouse in place
+    blocked = np.pad(rock, 1, constant_values=True)
+
+    padded = np.zeros((rows + 2, cols + 2), dtype=dtype)
+    maze = padded[1:-1, 1:-1]
+    if initial_utilities is not None:
+        maze[...] = np.where(free, initial_utilities, rewards)
+    max_error = MAX_ERROR
+    count = 0
+    report_progress = ProgressClock(progress, progress_interval)
+    if stats is not None:
+        stats.setup_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+
+    while True:
+        temp, max_util_change = stencil_update(padded, blocked, rewards, free)
+
+        count+= 1
+        maze[...] = temp
+        if stats is not None:
+            stats.residuals.append(float(max_util_change))
+        if max_util_change < max_error:
+            break
+        report_progress(count, max_util_change)
+
+    return finish_stats(stats, start_time, maze.copy, count)
+
+
+def table_value_iteration(rewards, progress, progress_interval, reward_table, dtype, prune, mode,
+                          evaluation_sweeps, initial_utilities, stats):
+    """Gauss-Seidel or policy iteration sweeps of the vectorized backend.
+
+    Neighbor utilities are gathered through the neighbor table rather than
+    shifted views of the whole grid, so a sweep can update one color of the
+    checkerboard at a time or follow a fixed policy. Each color, or each
+    whole sweep, is computed before it is written, which gives the same
+    utilities and sweep count as seq_value_iteration in the same mode.
+    """
+    start_time = time.perf_counter()
+    free_cells, neighbors, fixed_utilities = pruned_neighbor_table(rewards, reward_table, prune)
+    if mode == 'gauss_seidel':
+        free_cells, neighbors, red_count = red_black_order(free_cells, neighbors, rewards.shape[-1])
+        colors = (slice(0, red_count), slice(red_count, None))
+    else:
+        colors = (slice(None),)
+    maze = start_utilities(fixed_utilities, free_cells, mode, dtype, initial_utilities)
+    free_rewards = fixed_utilities.ravel()[free_cells].astype(dtype)
+    moves = None
+    evaluations_left = 0
+    max_error = MAX_ERROR
+    count = 0
+    report_progress = ProgressClock(progress, progress_interval)
+    if stats is not None:
+        stats.setup_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+
+    while True:
+        is_bellman = not evaluations_left
+        max_util_change = 0.0
+        if is_bellman:
+            for color in colors:
+                mixes = table_mixes(maze, neighbors[color])
+                if mode == 'policy_iteration':
+                    best_moves = mixes.argmax(axis=0)
+                    moves = policy_table(neighbors, best_moves)
+                    best_val = np.take_along_axis(mixes, best_moves[np.newaxis], axis=0)[0]
+                    evaluations_left = evaluation_sweeps
+                else:
+                    best_val = mixes.max(axis=0)
+                temp = free_rewards[color] + DISCOUNT_FACTOR*best_val
+                max_util_change = max(max_util_change, np.abs(temp - maze[free_cells[color]]).max(initial=0.0))
+                maze[free_cells[color]] = temp
+        else:
+            temp = free_rewards + DISCOUNT_FACTOR*(0.8*maze[moves[:, 0]] + 0.1*maze[moves[:, 1]] +
+                                                   0.1*maze[moves[:, 2]])
+            max_util_change = np.abs(temp - maze[free_cells]).max(initial=0.0)
+            maze[free_cells] = temp
+            evaluations_left-= 1
+
+        count+= 1
+        if stats is not None:
+            stats.residuals.append(float(max_util_change))
+        if is_bellman and max_util_change < max_error:
+            break
+        report_progress(count, max_util_change)
+
+    return finish_stats(stats, start_time, lambda: maze.reshape(rewards.shape).copy(), count)
+
+
+def finish_stats(stats, sweep_start_time, copy_result, count):
+    """Times the sweeps up to now and the result copy into stats, and returns (result, count).
+
+    copy_result is called to build the result, stats may be None.
+    """
+    if stats is None:
+        return (copy_result(), count)
+
+    start_time = time.perf_counter()
+    stats.sweep_time = start_time - sweep_start_time
+    result = copy_result()
+    stats.copy_time = time.perf_counter() - start_time
+    stats.count = count
+    return (result, count)
+
+
+def auto_value_iteration(rewards, allow_parallel=True, stats=None, **options):
+    """Updating of maze cell values with the backend that suits the grid size.
+
+    Picks the sequential, vectorized or parallel backend from thresholds
+    calibrated on this machine and runs it with the Numba thread count that
+    matches the grid size, restoring the thread count afterwards.
+    allow_parallel=False keeps to the backends that need no compiled
+    kernels, and a dtype option rules out the sequential backend, which
+    only sweeps Python floats. The stats record the backend picked.
+    """
+    backend, threads = choose_backend(rewards.size, BACKENDS, allow_sequential='dtype' not in options,
+                                      allow_parallel=allow_parallel and 'parallel' in BACKENDS)
+    if stats is not None:
+        stats.backend = backend
+    with use_threads(threads):
+        return BACKENDS[backend](rewards, stats=stats, **options)
+
+
+BACKENDS = {
+    'sequential': seq_value_iteration,
+    'vectorized': vectorized_value_iteration,
+    'tiled': tiled_value_iteration,
+    'sparse': sparse_value_iteration,
+    'auto': auto_value_iteration,
+}
+if parallel_value_iteration is not None:
+    BACKENDS['parallel'] = parallel_value_iteration
+DEFAULT_BACKEND = 'parallel' if parallel_value_iteration is not None else 'vectorized'
+
+# Backends that read a CellType grid and its reward table directly
+CELL_TYPE_BACKENDS = ('sequential', 'vectorized', 'parallel', 'tiled', 'sparse', 'auto')
+# Backends that fill in a SolveStats
+STATS_BACKENDS = ('sequential', 'vectorized', 'parallel', 'tiled', 'sparse', 'auto')
+# Backends that sweep in every one of SOLVE_MODES and take warm starts, the others
+# only run cold Jacobi sweeps
+MODE_BACKENDS = ('sequential', 'vectorized', 'parallel', 'auto')
+# Warm-ups of the backends with Numba kernels to compile
+KERNEL_WARM_UPS = {'parallel': parallel_warm_up, 'sparse': sparse_warm_up} if numba is not None else {}
+
+
+def warm_up(backends=None):
+    """Compiles the kernels of the named backends, or loads them from the cache.
+
+    backends defaults to every backend in KERNEL_WARM_UPS, and the others
+    have nothing to compile. Returns the seconds taken.
+    """
+    start_time = time.perf_counter()
+    for backend in KERNEL_WARM_UPS if backends is None else backends:
+        if backend in KERNEL_WARM_UPS:
+            KERNEL_WARM_UPS[backend]()
+    return time.perf_counter() - start_time
+
+
+def solve(rewards, backend=DEFAULT_BACKEND, reward_table=CELL_REWARDS, **options):
+    """Runs value iteration on a rewards matrix with the named backend.
+
+    rewards can also be a uint8 grid of CellType values, whose rewards come
+    from reward_table. Backends that cannot read cell types are given the
+    rewards matrix looked up from it instead. Extra keyword options, such as
+    a progress callback, are passed on to the backend. A mode option other
+    than 'jacobi' needs one of MODE_BACKENDS. multigrid=True warm starts the
+    solve from coarser copies of the grid, which only helps, and so is only
+    accepted, in 'gauss_seidel' mode.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+    mode = options.pop('mode', 'jacobi')
+    if mode not in SOLVE_MODES:
+        raise ValueError(f"Unknown solve mode '{mode}', expected one of: {', '.join(SOLVE_MODES)}")
+    multigrid = options.pop('multigrid', False)
+    if multigrid and mode != 'gauss_seidel':
+        raise ValueError("Multigrid warm starts need the 'gauss_seidel' mode")
+
+    if backend in MODE_BACKENDS:
+        options['mode'] = mode
+    elif mode != 'jacobi':
+        raise ValueError(f"The {backend} backend only sweeps in 'jacobi' mode")
+    elif multigrid:
+        raise ValueError(f"The {backend} backend cannot be warm started from coarser grids")
+
+    if multigrid:
+        return multigrid_value_iteration(rewards, BACKENDS[backend], reward_table, **options)
+
+    if backend in CELL_TYPE_BACKENDS:
+        options['reward_table'] = reward_table
+    elif is_cell_grid(rewards):
+        rewards = cell_rewards(rewards, reward_table)
+    return BACKENDS[backend](rewards, **options)
+
+
+def solve_with_stats(rewards, backend=DEFAULT_BACKEND, **options):
+    """Runs solve() and returns the utilities together with a SolveStats.
+
+    Backends that do not fill in stats still report the sweep count, and
+    their whole run is counted as sweep time.
+    """
+    stats = SolveStats(backend)
+    if backend in STATS_BACKENDS:
+        utilities, _ = solve(rewards, backend, stats=stats, **options)
+    else:
+        start_time = time.perf_counter()
+        utilities, stats.count = solve(rewards, backend, **options)
+        stats.sweep_time = time.perf_counter() - start_time
+    return (utilities, stats)
+
+
+def solve_batch(rewards, backend=DEFAULT_BACKEND, reward_table=CELL_REWARDS):
+    """Solves an (N, H, W) stack of rewards matrices or CellType grids.
+
+    Returns the (N, H, W) utilities and the (N,) iteration counts. The
+    parallel backend solves the whole stack in one compiled call, the
+    other backends solve the grids one at a time.
+    """
+    if backend == 'parallel' and batch_value_iteration is not None:
+        return batch_value_iteration(rewards, reward_table)
+
+    solutions = [solve(grid, backend, reward_table) for grid in rewards]
+    utilities = np.array([grid_utilities for grid_utilities, _ in solutions]).reshape(rewards.shape)
+    counts = np.array([count for _, count in solutions], dtype=np.int64)
+    return (utilities, counts)
@@ -0,0 +1,26 @@
+"""Shared setup and seeded maps of the solver tests."""
+import os
+
+# Parallel kernels run by pytest can hang the process at exit under TBB
+os.environ.setdefault('NUMBA_THREADING_LAYER_PRIORITY', 'omp workqueue tbb')
+
+# pylint: disable=wrong-import-position
+import numpy as np
+from solver.constants import DISCOUNT_FACTOR, MAX_ERROR, CellType
+
+# Rewards where empty and mouse cells differ from the defaults
+CUSTOM_REWARDS = np.array([-0.02, -0.01, 1.0, -3.0, -0.1])
+# Two solves stopped by the usual criterion are each this close to the exact utilities
+SOLUTION_ERROR = MAX_ERROR*DISCOUNT_FACTOR/(1 - DISCOUNT_FACTOR)
+
+
+def seeded_cells(size=24, seed=0, density=0.25):
+    """Builds a seeded CellType grid with rocks, fires, a mouse and a cheese."""
+    rng = np.random.default_rng(seed)
+    cells = np.full((size, size), CellType.EMPTY, dtype=np.uint8)
+    obstacles = rng.random((size, size))
+    cells[obstacles < density] = CellType.ROCK
+    cells[obstacles < density/5] = CellType.FIRE
+    cells[0, 0] = CellType.MOUSE
+    cells[size - 1, size - 1] = CellType.REWARD
+    return cells
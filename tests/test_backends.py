@@ -0,0 +1,14 @@
+"""Agreement of the value iteration backends."""
+import numpy as np
+import pytest
+from conftest import seeded_cells
+from solver import BACKENDS, cell_rewards, solve
+
+
+@pytest.mark.parametrize('backend', sorted(set(BACKENDS) - {'auto'}))
+def test_backends_agree(backend):
+    rewards = cell_rewards(seeded_cells(seed=1))
+    expected, expected_count = solve(rewards, 'sequential')
+    utilities, count = solve(rewards, backend)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    assert count == expected_count > 0
@@ -0,0 +1,28 @@
+"""Solving stacks of grids."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import BACKENDS, CELL_REWARDS, cell_rewards, solve, solve_batch
+
+
+@pytest.mark.parametrize('backend', sorted({'parallel', 'vectorized'} & set(BACKENDS)))
+@pytest.mark.parametrize('reward_table', [CELL_REWARDS, CUSTOM_REWARDS])
+def test_batch_matches_single_solves(backend, reward_table):
+    # Grids of one stack need different sweep counts
+    cells = np.stack([seeded_cells(seed=seed, density=density)
+                      for seed, density in enumerate((0.0, 0.1, 0.25, 0.4))])
+    utilities, counts = solve_batch(cells, backend, reward_table)
+    assert utilities.shape == cells.shape and counts.shape == (cells.shape[0],)
+    for grid, grid_utilities, count in zip(cells, utilities, counts):
+        expected, expected_count = solve(grid, 'sequential', reward_table)
+        np.testing.assert_allclose(grid_utilities, expected, rtol=0, atol=1e-12)
+        assert count == expected_count
+    assert len(set(counts.tolist())) > 1
+
+
+def test_batch_of_rewards_matrices():
+    cells = np.stack([seeded_cells(seed=seed) for seed in range(3)])
+    utilities, counts = solve_batch(cell_rewards(cells), 'parallel' if 'parallel' in BACKENDS else 'vectorized')
+    expected, expected_counts = solve_batch(cells, 'vectorized')
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(counts, expected_counts)
@@ -0,0 +1,67 @@
+"""Content-addressed solution cache."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import SolutionCache, solution_key, solve
+
+
+def test_key_covers_solution_inputs():
+    cells = seeded_cells()
+    key = solution_key(cells, 'vectorized')
+    assert key == solution_key(cells.copy(), 'vectorized')
+    assert key != solution_key(cells, 'parallel')
+    assert key != solution_key(cells, 'vectorized', reward_table=CUSTOM_REWARDS)
+    assert key != solution_key(cells.astype(np.float64), 'vectorized')
+    edited = cells.copy()
+    edited[5, 5] = 4 - edited[5, 5]
+    assert key != solution_key(edited, 'vectorized')
+
+
+def test_hits_return_the_solution():
+    cells = seeded_cells()
+    cache = SolutionCache()
+    utilities, count = cache.solve(cells, 'vectorized', CUSTOM_REWARDS)
+    expected, expected_count = solve(cells, 'vectorized', CUSTOM_REWARDS)
+    np.testing.assert_array_equal(utilities, expected)
+    assert count == expected_count
+    # Cached utilities are shared, so they cannot be written to
+    assert not utilities.flags.writeable
+    assert cache.solve(cells, 'vectorized', CUSTOM_REWARDS)[0] is utilities
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_least_recently_used_is_evicted():
+    grids = [seeded_cells(size=8, seed=seed) for seed in range(3)]
+    keys = [solution_key(grid, 'vectorized') for grid in grids]
+    cache = SolutionCache(max_entries=2)
+    cache.solve(grids[0], 'vectorized')
+    cache.solve(grids[1], 'vectorized')
+    assert cache.get(keys[0]) is not None
+    cache.solve(grids[2], 'vectorized')
+    assert len(cache) == 2 and cache.stats['evictions'] == 1
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+@pytest.mark.parametrize('max_entries', [0, 2])
+def test_disk_tier_outlives_memory(tmp_path, max_entries):
+    grids = [seeded_cells(size=8, seed=seed) for seed in range(3)]
+    cache = SolutionCache(max_entries, tmp_path)
+    solutions = [cache.solve(grid, 'vectorized') for grid in grids]
+    # A new cache over the same directory reads every solution back
+    reader = SolutionCache(max_entries, tmp_path)
+    for grid, (utilities, count) in zip(grids, solutions):
+        cached_utilities, cached_count = reader.solve(grid, 'vectorized')
+        np.testing.assert_array_equal(cached_utilities, utilities)
+        assert cached_count == count
+    assert reader.stats['disk_hits'] == 3 and reader.stats['misses'] == 0
+
+
+def test_disk_tier_skips_partial_entries(tmp_path):
+    cells = seeded_cells(size=8)
+    key = solution_key(cells, 'vectorized')
+    (tmp_path / f"{key}.npy").write_bytes(b'truncated')
+    cache = SolutionCache(cache_dir=tmp_path)
+    assert cache.get(key) is None
+    utilities, _ = cache.solve(cells, 'vectorized')
+    np.testing.assert_array_equal(utilities, solve(cells, 'vectorized')[0])
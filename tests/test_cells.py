@@ -0,0 +1,36 @@
+"""Solves of CellType grids against solves of their rewards matrices."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import BACKENDS, CELL_REWARDS, CellType, cell_rewards, grid_cells, solve
+from solver.value_iteration import CELL_TYPE_BACKENDS
+
+
+@pytest.mark.parametrize('backend', sorted(set(CELL_TYPE_BACKENDS) & set(BACKENDS) - {'auto'}))
+def test_cell_grid_matches_rewards(backend):
+    cells = seeded_cells(seed=3)
+    expected, expected_count = solve(cell_rewards(cells), backend)
+    utilities, count = solve(cells, backend)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    assert count == expected_count
+
+
+@pytest.mark.parametrize('backend', sorted(set(CELL_TYPE_BACKENDS) & set(BACKENDS) - {'auto'}))
+def test_custom_reward_table(backend):
+    cells = seeded_cells(seed=3)
+    expected, expected_count = solve(cells, 'sequential', CUSTOM_REWARDS)
+    utilities, count = solve(cells, backend, CUSTOM_REWARDS)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    assert count == expected_count
+    # The solve must not fall back to the default table
+    assert not np.allclose(expected, solve(cells, 'sequential')[0])
+
+
+def test_grid_cells_round_trip():
+    cells = seeded_cells(seed=3)
+    # Mouse cells have the empty cell reward, so they come back as empty cells
+    cells[cells == CellType.MOUSE] = CellType.EMPTY
+    np.testing.assert_array_equal(grid_cells(cell_rewards(cells)), cells)
+    assert grid_cells(cells) is cells
+    with pytest.raises(ValueError):
+        grid_cells(cell_rewards(cells, CUSTOM_REWARDS), CELL_REWARDS)
@@ -0,0 +1,14 @@
+"""Numba parallel diagnostics of the cached kernels."""
+import pytest
+from conftest import seeded_cells
+from solver import solve
+
+parallel = pytest.importorskip('solver.parallel')
+
+
+def test_diagnostics_of_cached_kernel(capsys):
+    solve(seeded_cells(), 'parallel')
+    if not parallel.parallel_sweeps.signatures:
+        pytest.skip("The parallel backend runs the ahead-of-time build")
+    assert parallel.parallel_diagnostics()
+    assert 'Parallel Accelerator Optimizing' in capsys.readouterr().out
@@ -0,0 +1,85 @@
+"""Automatic backend choice and the Numba thread count it sets."""
+import json
+import os
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import BACKENDS, dispatch, solve, solve_with_stats
+
+
+class FakeNumba:
+    """Stands in for numba to record the thread counts set."""
+    def __init__(self, threads):
+        self.threads = threads
+        self.config = SimpleNamespace(NUMBA_NUM_THREADS=threads)
+
+    def get_num_threads(self):
+        return self.threads
+
+    def set_num_threads(self, threads):
+        self.threads = threads
+
+
+def test_threads_are_restored(monkeypatch):
+    fake_numba = FakeNumba(4)
+    monkeypatch.setattr(dispatch, 'numba', fake_numba)
+    with dispatch.use_threads(2):
+        assert fake_numba.threads == 2
+    assert fake_numba.threads == 4
+    with pytest.raises(RuntimeError):
+        with dispatch.use_threads(1):
+            raise RuntimeError()
+    assert fake_numba.threads == 4
+    with dispatch.use_threads(None):
+        assert fake_numba.threads == 4
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    """Sets the calibrated thresholds without timing the backends."""
+    def set_thresholds(vectorized_min_cells, parallel_min_cells):
+        monkeypatch.setattr(dispatch, 'calibration', {
+            'costs': {'parallel': None},
+            'vectorized_min_cells': vectorized_min_cells,
+            'parallel_min_cells': parallel_min_cells,
+        })
+    return set_thresholds
+
+
+def test_backend_thresholds(monkeypatch, thresholds):
+    monkeypatch.setattr(dispatch, 'numba', FakeNumba(4))
+    thresholds(100, 10000)
+    assert dispatch.choose_backend(99, BACKENDS) == ('sequential', None)
+    assert dispatch.choose_backend(99, BACKENDS, allow_sequential=False) == ('vectorized', None)
+    assert dispatch.choose_backend(100, BACKENDS) == ('vectorized', None)
+    assert dispatch.choose_backend(10000, BACKENDS) == ('parallel', 1)
+    assert dispatch.choose_backend(10000, BACKENDS, allow_parallel=False) == ('vectorized', None)
+    assert dispatch.choose_backend(3*dispatch.CELLS_PER_THREAD, BACKENDS) == ('parallel', 3)
+    assert dispatch.choose_backend(100*dispatch.CELLS_PER_THREAD, BACKENDS) == ('parallel', 4)
+    thresholds(None, None)
+    assert dispatch.choose_backend(10**8, BACKENDS) == ('sequential', None)
+
+
+def test_recalibrates_for_other_thread_counts(monkeypatch, tmp_path):
+    path = tmp_path / 'calibration.json'
+    path.write_text(json.dumps({'version': dispatch.CALIBRATION_VERSION, 'cpu_count': os.cpu_count(),
+                                'max_threads': dispatch.max_threads() + 1, 'costs': {}}))
+    calibrations = []
+    monkeypatch.setattr(dispatch, 'calibration', None)
+    monkeypatch.setattr(dispatch, 'calibrate', lambda *args: calibrations.append(args) or {'costs': {}})
+    dispatch.load_calibration(BACKENDS, str(path), include_parallel=False)
+    assert calibrations
+
+
+@pytest.mark.parametrize('vectorized_min_cells, parallel_min_cells', [(10**8, None), (1, None), (1, 1)],
+                         ids=['sequential', 'vectorized', 'parallel'])
+def test_auto_agrees_with_vectorized(thresholds, vectorized_min_cells, parallel_min_cells):
+    thresholds(vectorized_min_cells, parallel_min_cells)
+    cells = seeded_cells(seed=4)
+    expected, expected_count = solve(cells, 'vectorized', CUSTOM_REWARDS)
+    utilities, stats = solve_with_stats(cells, 'auto', reward_table=CUSTOM_REWARDS)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    assert stats.count == expected_count
+    assert stats.backend == ('parallel' if parallel_min_cells and 'parallel' in BACKENDS else
+                             'vectorized' if vectorized_min_cells == 1 else 'sequential')
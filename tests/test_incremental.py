@@ -0,0 +1,38 @@
+"""Warm-started incremental re-solves."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import CellType, solve
+from solver.constants import MAX_ERROR
+from solver.grid import grid_rewards
+from solver.incremental import frontier_update, incremental_value_iteration
+from solver.neighbors import build_neighbor_table
+
+
+def max_residual(cells, utilities, reward_table):
+    """Largest change a full Bellman sweep still makes to utilities."""
+    free_cells, neighbors = build_neighbor_table(cells)
+    flat_rewards = np.asarray(grid_rewards(cells, reward_table), dtype=np.float64).ravel()
+    return frontier_update(utilities.ravel().copy(), flat_rewards, neighbors, free_cells).max(initial=0.0)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_incremental_solve_converges(seed):
+    cells = seeded_cells(seed=seed)
+    utilities, _ = solve(cells, 'vectorized', CUSTOM_REWARDS)
+    rng = np.random.default_rng(seed)
+    edited = cells.copy()
+    for row, col in rng.integers(1, cells.shape[0] - 1, (3, 2)):
+        edited[row, col] = rng.choice([CellType.EMPTY, CellType.FIRE, CellType.ROCK])
+    dirty_cells = np.argwhere(CUSTOM_REWARDS[edited] != CUSTOM_REWARDS[cells])
+
+    warm, _ = incremental_value_iteration(edited, utilities, dirty_cells, reward_table=CUSTOM_REWARDS)
+    assert max_residual(edited, warm, CUSTOM_REWARDS) < MAX_ERROR
+
+
+def test_unchanged_grid_only_verifies():
+    cells = seeded_cells()
+    utilities, _ = solve(cells, 'vectorized')
+    warm, count = incremental_value_iteration(cells, utilities, np.zeros((0, 2)))
+    assert count == 1
+    np.testing.assert_allclose(warm, utilities, rtol=0, atol=MAX_ERROR)
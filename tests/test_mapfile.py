@@ -0,0 +1,93 @@
+"""Map files of cell types and solved results."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import MapWriter, extract_policy, load_grid, load_maps, save_map, solve, solve_batch
+from solver.cli import main
+
+
+def test_map_file_round_trip(tmp_path):
+    cells = seeded_cells()
+    utilities, count = solve(cells, 'vectorized', CUSTOM_REWARDS)
+    policy = extract_policy(utilities, cells)
+    path = tmp_path / 'map.mousemap'
+    save_map(path, cells, CUSTOM_REWARDS, utilities=utilities, policy=policy, count=count)
+
+    maps = load_maps(path)
+    assert len(maps) == 1 and maps.shape == cells.shape
+    np.testing.assert_array_equal(maps.reward_table, CUSTOM_REWARDS)
+    np.testing.assert_array_equal(maps.cells[0], cells)
+    np.testing.assert_array_equal(maps.utilities[0], utilities)
+    np.testing.assert_array_equal(maps.policy[0], policy)
+    assert maps.counts[0] == count
+    # Fields are read-only views into the mapped file
+    assert not maps.cells.flags.writeable
+    assert np.shares_memory(maps.cells, maps.records)
+
+
+def test_map_file_without_results(tmp_path):
+    path = tmp_path / 'map.mousemap'
+    save_map(path, seeded_cells())
+    maps = load_maps(path)
+    assert maps.utilities is None and maps.counts is None and maps.policy is None
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'map.mousemap'
+    path.write_bytes(b'not a map file at all')
+    with pytest.raises(ValueError):
+        load_maps(path)
+
+
+def test_partially_flushed_writer(tmp_path):
+    cells = np.stack([seeded_cells(seed=seed) for seed in range(3)])
+    path = tmp_path / 'maps.mousemap'
+    writer = MapWriter(path, cells.shape[1:])
+    writer.extend(cells[:2])
+    assert len(load_maps(path)) == 0
+    writer.flush()
+    writer.append(cells[2])
+    # The third map is written but not counted until the next flush
+    maps = load_maps(path)
+    assert len(maps) == 2
+    np.testing.assert_array_equal(maps.cells, cells[:2])
+    writer.close()
+    np.testing.assert_array_equal(load_maps(path).cells, cells)
+
+
+def test_writer_rejects_mismatched_maps(tmp_path):
+    with MapWriter(tmp_path / 'maps.mousemap', (24, 24), utilities_dtype=np.float64) as writer:
+        with pytest.raises(ValueError):
+            writer.append(seeded_cells())
+        with pytest.raises(ValueError):
+            writer.append(seeded_cells(size=12), np.zeros((12, 12)))
+
+
+def test_map_file_solved_with_its_reward_table(tmp_path):
+    cells = np.stack([seeded_cells(seed=seed) for seed in range(2)])
+    path = tmp_path / 'maps.mousemap'
+    with MapWriter(path, cells.shape[1:], CUSTOM_REWARDS) as writer:
+        writer.extend(cells)
+
+    grids, reward_table = load_grid(str(path))
+    utilities, counts = solve_batch(grids, 'vectorized', reward_table)
+    for index, grid in enumerate(cells):
+        expected, count = solve(grid, 'vectorized', CUSTOM_REWARDS)
+        np.testing.assert_allclose(utilities[index], expected, rtol=0, atol=1e-12)
+        assert counts[index] == count
+
+
+def test_cli_streams_into_map_file(tmp_path):
+    cells = np.stack([seeded_cells(seed=seed) for seed in range(3)])
+    input_path = tmp_path / 'grids.npy'
+    np.save(input_path, cells)
+    output_path = tmp_path / 'solved.mousemap'
+    assert main(['-b', 'vectorized', '--map-output', str(output_path), str(input_path)]) == 0
+
+    maps = load_maps(output_path)
+    np.testing.assert_array_equal(maps.cells, cells)
+    for index, grid in enumerate(cells):
+        expected, count = solve(grid, 'vectorized')
+        np.testing.assert_allclose(maps.utilities[index], expected, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(maps.policy[index], extract_policy(expected, grid))
+        assert maps.counts[index] == count
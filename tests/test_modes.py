@@ -0,0 +1,32 @@
+"""Agreement of the solve modes between backends and with Jacobi sweeps."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, SOLUTION_ERROR, seeded_cells
+from solver import BACKENDS, CELL_REWARDS, SOLVE_MODES, solve
+from solver.value_iteration import MODE_BACKENDS
+
+
+@pytest.mark.parametrize('mode', SOLVE_MODES)
+@pytest.mark.parametrize('backend', sorted(set(MODE_BACKENDS) & set(BACKENDS) - {'auto'}))
+@pytest.mark.parametrize('reward_table', [CELL_REWARDS, CUSTOM_REWARDS], ids=['default', 'custom'])
+def test_modes_agree(backend, mode, reward_table):
+    cells = seeded_cells(seed=1)
+    expected, _ = solve(cells, 'vectorized', reward_table)
+    reference, reference_count = solve(cells, 'vectorized', reward_table, mode=mode)
+    utilities, count = solve(cells, backend, reward_table, mode=mode)
+    np.testing.assert_allclose(utilities, reference, rtol=0, atol=1e-12)
+    assert count == reference_count
+    # Every mode converges to the Jacobi solution within the tolerance
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=2*SOLUTION_ERROR)
+
+
+def test_faster_modes_take_fewer_sweeps():
+    cells = seeded_cells(size=48, seed=1, density=0.1)
+    jacobi_count = solve(cells, 'vectorized')[1]
+    assert solve(cells, 'vectorized', mode='gauss_seidel')[1] < jacobi_count
+
+
+@pytest.mark.parametrize('backend', sorted(set(BACKENDS) - set(MODE_BACKENDS)))
+def test_other_backends_reject_modes(backend):
+    with pytest.raises(ValueError):
+        solve(seeded_cells(), backend, mode='gauss_seidel')
@@ -0,0 +1,33 @@
+"""Coarse-to-fine warm starts."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, SOLUTION_ERROR, seeded_cells
+from solver import BACKENDS, CELL_REWARDS, CellType, solve, solve_with_stats
+from solver.value_iteration import MODE_BACKENDS
+
+
+@pytest.mark.parametrize('backend', sorted(set(MODE_BACKENDS) & set(BACKENDS) - {'auto'}))
+@pytest.mark.parametrize('reward_table', [CELL_REWARDS, CUSTOM_REWARDS], ids=['default', 'custom'])
+def test_multigrid_agrees(backend, reward_table):
+    cells = seeded_cells(size=80, seed=5, density=0.2)
+    expected, _ = solve(cells, 'vectorized', reward_table)
+    utilities, stats = solve_with_stats(cells, backend, reward_table=reward_table, mode='gauss_seidel',
+                                        multigrid=True)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=2*SOLUTION_ERROR)
+    assert stats.level_counts and stats.count > 0
+
+
+def test_multigrid_with_sealed_cells():
+    # A wall seals the left half of the map off from the cheese
+    cells = np.full((64, 64), CellType.EMPTY, dtype=np.uint8)
+    cells[:, 31] = CellType.ROCK
+    cells[63, 63] = CellType.REWARD
+    expected, _ = solve(cells, 'vectorized', mode='gauss_seidel')
+    utilities, _ = solve(cells, 'vectorized', mode='gauss_seidel', multigrid=True)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=2*SOLUTION_ERROR)
+
+
+@pytest.mark.parametrize('mode', ['jacobi', 'policy_iteration'])
+def test_multigrid_needs_gauss_seidel(mode):
+    with pytest.raises(ValueError):
+        solve(seeded_cells(), 'vectorized', mode=mode, multigrid=True)
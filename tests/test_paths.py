@@ -0,0 +1,31 @@
+"""Batch path tracing against tracing one path at a time."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import CellType, Direction, PathEnd, extract_policy, solve, trace_path, trace_paths
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_matches_single_paths(seed):
+    cells = seeded_cells(seed=seed)
+    utilities, _ = solve(cells, 'vectorized', CUSTOM_REWARDS)
+    policy = extract_policy(utilities, cells)
+    starts = np.argwhere((cells == CellType.EMPTY) | (cells == CellType.MOUSE))
+    lengths, end_cells, ends = trace_paths(policy, cells, starts)
+
+    for start, length, end_cell, end in zip(starts, lengths, end_cells, ends):
+        path, expected_end = trace_path(policy, cells, tuple(start))
+        assert end == expected_end.value
+        if expected_end != PathEnd.LOOP:
+            assert length == len(path) - 1
+            assert tuple(end_cell) == path[-1]
+
+
+def test_loops_and_dead_ends():
+    cells = np.zeros((1, 4), dtype=np.uint8)
+    directions = [Direction.RIGHT, Direction.LEFT, Direction.CURRENT, Direction.CURRENT]
+    policy = np.array([[direction.value for direction in directions]], dtype=np.int8)
+    lengths, _, ends = trace_paths(policy, cells, [(0, 0), (0, 2)], max_steps=5)
+    assert list(ends) == [PathEnd.LOOP.value, PathEnd.DEAD_END.value]
+    assert list(lengths) == [5, 0]
+    assert trace_path(policy, cells, (0, 0)) == ([(0, 0), (0, 1)], PathEnd.LOOP)
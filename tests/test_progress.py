@@ -0,0 +1,27 @@
+"""Progress reports and cancellation."""
+import pytest
+from conftest import seeded_cells
+from solver import BACKENDS, SolveCancelled, solve
+
+
+@pytest.mark.parametrize('backend', sorted(set(BACKENDS) - {'tiled'}))
+def test_every_sweep_can_report(backend):
+    reports = []
+    _, count = solve(seeded_cells(), backend, progress=lambda *report: reports.append(report),
+                     progress_interval=0)
+    counts = [report_count for report_count, _ in reports]
+    assert counts == sorted(set(counts)) and 0 < counts[-1] < count
+
+
+@pytest.mark.parametrize('backend', sorted(set(BACKENDS) - {'tiled'}))
+def test_progress_cancels(backend):
+    def cancel(count, max_util_change):
+        raise SolveCancelled()
+    with pytest.raises(SolveCancelled):
+        solve(seeded_cells(), backend, progress=cancel, progress_interval=0)
+
+
+def test_reports_are_paced():
+    reports = []
+    solve(seeded_cells(), 'sequential', progress=lambda *report: reports.append(report), progress_interval=60)
+    assert not reports
@@ -0,0 +1,48 @@
+"""Reachability pruning and the flood fills behind it."""
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, SOLUTION_ERROR, seeded_cells
+from solver import CELL_REWARDS, CellType, solve
+from solver.grid import cell_masks
+from solver.reachability import compiled_flood_fill, numpy_flood_fill
+
+
+def test_pruning_matches_full_solve():
+    # A wall seals the mouse off from every terminal cell
+    cells = np.full((8, 8), CellType.EMPTY, dtype=np.uint8)
+    cells[:, 4] = CellType.ROCK
+    cells[2, 1] = CellType.MOUSE
+    cells[7, 7] = CellType.REWARD
+    for reward_table in (CELL_REWARDS, CUSTOM_REWARDS):
+        pruned, _ = solve(cells, 'vectorized', reward_table, prune=True)
+        full, _ = solve(cells, 'vectorized', reward_table, prune=False)
+        np.testing.assert_allclose(pruned, full, rtol=0, atol=2*SOLUTION_ERROR)
+
+
+@pytest.mark.skipif(compiled_flood_fill is None, reason="Numba is not installed")
+@pytest.mark.parametrize('seed', range(3))
+def test_flood_fills_agree(seed):
+    cells = np.stack([seeded_cells(seed=seed, density=0.45), seeded_cells(seed=seed + 3, density=0.45)])
+    free, rock = cell_masks(cells)
+    reached = []
+    for flood_fill in (numpy_flood_fill, compiled_flood_fill):
+        reached.append((~free & ~rock).ravel())
+        flood_fill(free.ravel(), reached[-1], *cells.shape[1:])
+    np.testing.assert_array_equal(reached[0], reached[1])
+    assert not reached[0].all()
+
+
+def test_numpy_backends_do_not_compile():
+    script = ("from solver import solve, CellType\n"
+              "from solver.reachability import compiled_flood_fill\n"
+              "import numpy as np\n"
+              "cells = np.zeros((4, 4), dtype=np.uint8)\n"
+              "cells[3, 3] = CellType.REWARD\n"
+              "solve(cells, 'vectorized')\n"
+              "print(len(compiled_flood_fill.signatures) if compiled_flood_fill else 0)\n")
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == '0'
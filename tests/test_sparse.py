@@ -0,0 +1,67 @@
+"""Sparse states of irregular floorplans and the command line."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import CELL_REWARDS, GRID_CELL_TYPES, CellType, parse_floorplan, solve, solve_sparse
+from solver.cli import main
+from solver.value_iteration import KERNEL_WARM_UPS
+
+SYMBOLS = {cell_type: symbol for symbol, cell_type in GRID_CELL_TYPES.items()}
+
+
+def floorplan_text(cells):
+    """Writes a CellType grid as a text floorplan."""
+    return '\n'.join(''.join(SYMBOLS[cell] for cell in row) for row in cells)
+
+
+@pytest.mark.parametrize('reward_table', [CELL_REWARDS, CUSTOM_REWARDS], ids=['default', 'custom'])
+def test_floorplan_matches_grid(reward_table):
+    cells = seeded_cells(seed=6)
+    expected, expected_count = solve(cells, 'vectorized', reward_table, prune=False)
+    maze = parse_floorplan(floorplan_text(cells), reward_table)
+    state_utilities, count = solve_sparse(maze)
+    utilities = maze.to_grid(state_utilities, cells.shape)
+    open_cells = cells != CellType.ROCK
+    np.testing.assert_allclose(utilities[open_cells], expected[open_cells], rtol=0, atol=1e-12)
+    assert count == expected_count
+
+
+def test_irregular_floorplan():
+    # An L-shaped room, the cells outside it are spaces or missing
+    text = ("M...\n"
+            "....\n"
+            "..  \n"
+            "..C")
+    maze = parse_floorplan(text)
+    assert maze.state_count == 13
+    cells = np.full((4, 4), CellType.ROCK, dtype=np.uint8)
+    for row_index, line in enumerate(text.splitlines()):
+        for col_index, symbol in enumerate(line):
+            if symbol != ' ':
+                cells[row_index, col_index] = GRID_CELL_TYPES[symbol]
+    expected, _ = solve(cells, 'vectorized', prune=False)
+    utilities = maze.to_grid(solve_sparse(maze)[0], cells.shape)
+    np.testing.assert_allclose(utilities[cells != CellType.ROCK], expected[cells != CellType.ROCK],
+                               rtol=0, atol=1e-12)
+
+
+def test_cli_warms_up_only_its_backend(tmp_path, monkeypatch):
+    warmed = []
+    for backend in list(KERNEL_WARM_UPS):
+        monkeypatch.setitem(KERNEL_WARM_UPS, backend, lambda backend=backend: warmed.append(backend))
+    grid_path = tmp_path / 'grid.txt'
+    grid_path.write_text(floorplan_text(seeded_cells()))
+    assert main(['-b', 'sparse', '-o', str(tmp_path), str(grid_path)]) == 0
+    assert warmed == (['sparse'] if 'sparse' in KERNEL_WARM_UPS else [])
+    assert (tmp_path / 'grid.npz').exists()
+
+
+def test_cli_without_kernels(tmp_path, monkeypatch, capsys):
+    for backend in list(KERNEL_WARM_UPS):
+        monkeypatch.delitem(KERNEL_WARM_UPS, backend)
+    grid_path = tmp_path / 'grid.txt'
+    grid_path.write_text(floorplan_text(seeded_cells()))
+    assert main(['-b', 'sparse', '-o', str(tmp_path), str(grid_path)]) == 0
+    assert 'compile' not in capsys.readouterr().out
+    with np.load(tmp_path / 'grid.npz') as result:
+        np.testing.assert_allclose(result['utilities'], solve(seeded_cells(), 'vectorized')[0], rtol=0, atol=1e-12)
@@ -0,0 +1,28 @@
+"""Tiled solves spread across several worker processes."""
+import numpy as np
+import pytest
+from conftest import CUSTOM_REWARDS, seeded_cells
+from solver import CELL_REWARDS, SolveCancelled, cell_rewards, solve, solve_with_stats
+
+
+@pytest.mark.parametrize('as_rewards', [False, True])
+@pytest.mark.parametrize('reward_table', [CELL_REWARDS, CUSTOM_REWARDS], ids=['default', 'custom'])
+def test_tiles_agree_with_vectorized(as_rewards, reward_table):
+    cells = seeded_cells(size=30, seed=2)
+    grid = cell_rewards(cells, reward_table) if as_rewards else cells
+    expected, expected_count = solve(grid, 'vectorized', reward_table)
+    reports = []
+    utilities, stats = solve_with_stats(grid, 'tiled', tile_shape=(8, 8), workers=2,
+                                        reward_table=reward_table, progress=lambda *report: reports.append(report),
+                                        progress_interval=0)
+    np.testing.assert_allclose(utilities, expected, rtol=0, atol=1e-12)
+    assert stats.count == len(stats.residuals) == expected_count
+    assert stats.threads == 2
+    assert reports and all(0 < count <= stats.count for count, _ in reports)
+
+
+def test_tiles_cancel():
+    def cancel(count, max_util_change):
+        raise SolveCancelled()
+    with pytest.raises(SolveCancelled):
+        solve(seeded_cells(size=120), 'tiled', tile_shape=(32, 32), workers=2, progress=cancel, progress_interval=0)